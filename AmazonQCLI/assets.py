@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import pygame
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+# The web build has no threads; assets load on the event loop between frames
+THREADED = sys.platform != "emscripten"
+
+logger = logging.getLogger("mathball.assets")
+
+
+def display_format(surface, alpha=False):
+    """Convert a surface to the display's pixel format once a display exists"""
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
+
+class AssetManager:
+    """Loads images and sounds next to this module without blocking frames.
+
+    Decoding runs on a worker thread where threads exist. Surfaces are
+    converted to the display format back on the event loop thread, and the
+    time each asset took is kept in load_times (milliseconds).
+    """
+
+    def __init__(self, base_dir=ASSET_DIR):
+        self.base_dir = base_dir
+        self.load_times = {}
+
+    def find(self, *names):
+        """Path of the first of `names` that exists, or None"""
+        for name in names:
+            path = os.path.join(self.base_dir, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    async def run_loader(self, loader, path):
+        if THREADED:
+            return await asyncio.get_running_loop().run_in_executor(None, loader, path)
+        result = loader(path)
+        # Give the frame loop a turn before the next asset
+        await asyncio.sleep(0)
+        return result
+
+    async def load_image(self, *names, size=None, alpha=False):
+        path = self.find(*names)
+        if path is None:
+            return None
+        start = time.perf_counter()
+        try:
+            image = await self.run_loader(pygame.image.load, path)
+        except (pygame.error, OSError) as e:
+            logger.warning("could not load %s: %s", path, e)
+            return None
+        if size is not None:
+            image = pygame.transform.scale(image, size)
+        image = display_format(image, alpha)
+        self.record(path, start)
+        return image
+
+    async def load_sound(self, *names):
+        path = self.find(*names)
+        if path is None or not pygame.mixer.get_init():
+            return None
+        start = time.perf_counter()
+        try:
+            sound = await self.run_loader(pygame.mixer.Sound, path)
+        except (pygame.error, OSError) as e:
+            logger.warning("could not load %s: %s", path, e)
+            return None
+        self.record(path, start)
+        return sound
+
+    async def load_music(self, *names):
+        """Point the mixer's music stream at the first file found"""
+        path = self.find(*names)
+        if path is None or not pygame.mixer.get_init():
+            return False
+        start = time.perf_counter()
+        try:
+            pygame.mixer.music.load(path)
+        except pygame.error as e:
+            logger.warning("could not load %s: %s", path, e)
+            return False
+        self.record(path, start)
+        return True
+
+    def record(self, path, start):
+        name = os.path.relpath(path, self.base_dir)
+        self.load_times[name] = (time.perf_counter() - start) * 1000
+        logger.info("loaded %s in %.1f ms", name, self.load_times[name])
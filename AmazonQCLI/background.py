@@ -0,0 +1,127 @@
+import math
+import random
+from array import array
+from itertools import islice
+
+import pygame
+
+from assets import display_format
+
+# Number of precomputed gradient frames across the full sway of the animation
+GRADIENT_STEPS = 64
+# The gradient sways by +/- this much of its height
+GRADIENT_SWAY = 0.3
+# Translucent tint drawn over a background image
+IMAGE_TINT = (0, 0, 60)
+IMAGE_TINT_ALPHA = 120
+
+STAR_COUNT = 200
+MAX_STAR_SIZE = 4
+# Twinkle phase advance per frame; one period is about 126 frames
+TWINKLE_SPEED = 0.05
+TWINKLE_STEPS = round(2 * math.pi / TWINKLE_SPEED)
+
+
+class BackgroundLayer:
+    """Full-screen background composed once and redrawn with a single blit"""
+
+    def __init__(self, width, height, image=None, steps=GRADIENT_STEPS):
+        self.width = width
+        self.height = height
+        self.steps = steps
+        self.surface = pygame.Surface((width, height))
+        # Lookup table of 1-pixel-wide gradient strips, built lazily per step
+        self.columns = [None] * steps
+        self.step = None
+        # When False the gradient holds still at its current step
+        self.animate = True
+        self.set_image(image)
+
+    def set_image(self, image):
+        """Use an image instead of the animated gradient, tint baked in"""
+        self.has_image = image is not None
+        self.step = None
+        if not self.has_image:
+            return
+
+        self.surface.blit(image, (0, 0))
+        overlay = pygame.Surface((self.width, self.height))
+        overlay.set_alpha(IMAGE_TINT_ALPHA)
+        overlay.fill(IMAGE_TINT)
+        self.surface.blit(overlay, (0, 0))
+
+    def step_for(self, now):
+        time_offset = math.sin(now * 0.3) * GRADIENT_SWAY
+        ratio = (time_offset + GRADIENT_SWAY) / (2 * GRADIENT_SWAY)
+        return int(round(ratio * (self.steps - 1)))
+
+    def offset_for(self, step):
+        return (step / (self.steps - 1)) * 2 * GRADIENT_SWAY - GRADIENT_SWAY
+
+    def gradient_column(self, step):
+        column = self.columns[step]
+        if column is None:
+            time_offset = self.offset_for(step)
+            column = pygame.Surface((1, self.height), 0, self.surface)
+            for y in range(self.height):
+                color_ratio = y / self.height + time_offset
+                r = max(0, min(255, int(25 + (50 * color_ratio))))
+                g = max(0, min(255, int(35 + (70 * color_ratio))))
+                b = max(0, min(255, int(90 + (140 * color_ratio))))
+                column.set_at((0, y), (r, g, b))
+            self.columns[step] = column
+        return column
+
+    def update(self, now):
+        """Recompose the gradient only when its quantized step changes"""
+        if self.has_image or (not self.animate and self.step is not None):
+            return
+        step = self.step_for(now)
+        if step != self.step:
+            pygame.transform.scale(self.gradient_column(step), (self.width, self.height), self.surface)
+            self.step = step
+
+    def draw(self, screen, now):
+        self.update(now)
+        return screen.blit(self.surface, (0, 0))
+
+
+class Starfield:
+    """Twinkling stars stored as arrays and drawn with one batched blit.
+
+    Brightness comes from a periodic twinkle table, and every (size, phase)
+    pair is pre-rendered, so a frame only looks up sprites and positions.
+    """
+
+    def __init__(self, width, height, count=STAR_COUNT, rng=random):
+        self.count = count
+        # How many of the stars draw() shows
+        self.visible = count
+        self.frame = 0
+        self.x = array('h', (rng.randint(0, width) for _ in range(count)))
+        self.y = array('h', (rng.randint(0, height) for _ in range(count)))
+        self.size = array('b', (rng.randint(1, MAX_STAR_SIZE) for _ in range(count)))
+        self.phase = array('h', (rng.randrange(TWINKLE_STEPS) for _ in range(count)))
+        # Top-left corner of each star sprite, and its row in self.sprites
+        self.positions = [(x - s, y - s) for x, y, s in zip(self.x, self.y, self.size)]
+        self.rows = array('h', ((s - 1) * TWINKLE_STEPS for s in self.size))
+
+        self.table = [int(150 + 105 * math.sin(step * TWINKLE_SPEED)) for step in range(TWINKLE_STEPS)]
+        self.sprites = []
+        for size in range(1, MAX_STAR_SIZE + 1):
+            for brightness in self.table:
+                sprite = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+                pygame.draw.circle(sprite, (brightness, brightness, brightness), (size, size), size)
+                self.sprites.append(display_format(sprite, alpha=True))
+
+    def update(self):
+        self.frame = (self.frame + 1) % TWINKLE_STEPS
+
+    def draw(self, screen):
+        frame = self.frame
+        sprites = self.sprites
+        stars = zip(self.rows, self.phase, self.positions)
+        if self.visible < self.count:
+            stars = islice(stars, self.visible)
+        screen.blits([(sprites[row + (phase + frame) % TWINKLE_STEPS], position)
+                      for row, phase, position in stars], False)
@@ -0,0 +1,736 @@
+"""Benchmarks for the Math Ball Catcher render and simulation hot paths.
+
+Runs headless with fixed seeds and fixed ball and particle counts:
+
+    python benchmarks.py --output results.json
+    python benchmarks.py --compare results.json
+
+With --compare, any benchmark whose median is more than --threshold slower
+than the stored baseline is flagged and the exit status is 1. The legacy.*
+entries time the implementations that the caches replaced, for reference,
+on the same workload as the entry of the same name.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Rounds benchmarked here stay out of the player's own leaderboard
+os.environ.setdefault("MATHBALL_LEADERBOARD", os.path.join(tempfile.mkdtemp(), "leaderboard.db"))
+
+import pygame
+
+from background import STAR_COUNT, BackgroundLayer, Starfield
+from leaderboard import BATCH_ROUNDS, BENCH_ROUNDS, LeaderboardStore, fake_rounds
+from particles import ParticleSystem
+from problem_bank import BANK_PATH, ProblemBank, ProblemDeck
+from quality import QUALITY_LEVELS
+from replay import Recorder, Replay, replay_headless
+from scheduler import FrameScheduler
+from simulation import (
+    KEY_OTHER, KEY_RETURN, KEY_SPACE, MAX_BALLS, STORM_BALLS, MathBall, GameSimulation
+)
+
+SCREEN_WIDTH = 1300
+SCREEN_HEIGHT = 800
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED = 1234
+BALL_COUNT = 8
+PARTICLE_COUNT = 2000
+# Crowds the old implementations are compared at
+LARGE_PARTICLE_COUNT = 20000
+LARGE_STAR_COUNT = 5000
+# Rounds stored before timing leaderboard queries and inserts; --quick
+# uses QUICK_LEADERBOARD_ROUNDS instead
+LEADERBOARD_ROUNDS = BENCH_ROUNDS
+QUICK_LEADERBOARD_ROUNDS = 20000
+DEFAULT_THRESHOLD = 0.10
+# Runs in a fresh interpreter: construct the game and present the menu once
+FIRST_FRAME_SCRIPT = """
+import math_ball_game
+game = math_ball_game.MathBallGame()
+game.draw_background()
+game.draw_menu()
+game.present()
+"""
+
+BENCHMARKS = {}
+# Set by run_benchmarks from its scale
+leaderboard_rounds = LEADERBOARD_ROUNDS
+# Scratch leaderboard stores by round count, filled once per run
+scratch_stores = {}
+
+
+def benchmark(name, unit="call", number=100, self_timed=False):
+    """Register a setup function that returns the callable to time.
+
+    A self_timed callable measures itself and returns milliseconds, for
+    costs that wall time around the call would not isolate.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, unit, number, self_timed)
+        return setup
+    return register
+
+
+def legacy_draw_background(screen, bg_image, now):
+    """draw_background as it was before the background layer cache"""
+    if bg_image is not None:
+        screen.blit(bg_image, (0, 0))
+        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        overlay.set_alpha(120)
+        overlay.fill((0, 0, 60))
+        screen.blit(overlay, (0, 0))
+    else:
+        for y in range(SCREEN_HEIGHT):
+            color_ratio = y / SCREEN_HEIGHT
+            time_offset = math.sin(now * 0.3) * 0.3
+            r = max(0, min(255, int(25 + (50 * (color_ratio + time_offset)))))
+            g = max(0, min(255, int(35 + (70 * (color_ratio + time_offset)))))
+            b = max(0, min(255, int(90 + (140 * (color_ratio + time_offset)))))
+            pygame.draw.line(screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+
+
+class LegacyParticle:
+    """Particle as it was before the array-backed particle system"""
+
+    def __init__(self, x, y, color, rng):
+        self.x = x
+        self.y = y
+        self.vx = rng.uniform(-3, 3)
+        self.vy = rng.uniform(-5, -1)
+        self.life = 30
+        self.color = color
+        self.size = rng.randint(2, 5)
+
+    def update(self):
+        self.x += self.vx
+        self.y += self.vy
+        self.vy += 0.1
+        self.life -= 1
+
+    def draw(self, screen):
+        if self.life > 0:
+            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.size)
+
+
+class ScriptedPlayer:
+    """Clicks the lowest ball every `every` ticks and answers it.
+
+    Every third answer is deliberately wrong, so both answer paths run.
+    """
+
+    def __init__(self, sim, every=45, controls=None):
+        self.sim = sim
+        # Where inputs go, e.g. a replay Recorder; the sim itself by default
+        self.controls = controls or sim
+        self.every = every
+        self.answers = 0
+
+    def act(self):
+        sim = self.sim
+        if sim.ticks % self.every or sim.state != "game":
+            return
+        if sim.selected_ball is None:
+            if sim.balls:
+                ball = max(sim.balls, key=lambda b: b.y)
+                self.controls.mouse_down((ball.x, ball.y))
+            return
+        answer = sim.selected_ball.answer + (1 if self.answers % 3 == 2 else 0)
+        for char in str(answer):
+            self.controls.key_down(KEY_OTHER, char)
+        self.controls.key_down(KEY_RETURN)
+        self.answers += 1
+
+
+def start_round(sim, name="bench"):
+    sim.state = "name_input"
+    sim.player_name = name
+    sim.key_down(KEY_RETURN)
+
+
+def make_game(**options):
+    import math_ball_game
+    game = math_ball_game.MathBallGame(seed=SEED, **options)
+    # Nothing here keeps results; stop the leaderboard thread and close its
+    # database now instead of leaking one per benchmark
+    if game.leaderboard:
+        game.leaderboard.close()
+        game.leaderboard = None
+    return math_ball_game, game
+
+
+def fixed_balls(count=BALL_COUNT):
+    rng = random.Random(SEED)
+    return [MathBall(rng.randint(80, SCREEN_WIDTH - 80), rng.randint(100, SCREEN_HEIGHT - 100), rng)
+            for _ in range(count)]
+
+
+def end_frame(game):
+    """Drop what a frame queued for presenting, as run() would"""
+    game.dirty.current.clear()
+    game.profiler.begin_frame()
+
+
+def load_test_image():
+    image = pygame.image.load(os.path.join(BASE_DIR, "background.jpg"))
+    return pygame.transform.scale(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+
+
+@benchmark("ball.draw", number=400)
+def bench_ball_draw():
+    module, game = make_game()
+    balls = fixed_balls()
+    frame = [0]
+
+    def run():
+        ball = balls[frame[0] % len(balls)]
+        ball.update()
+        module.draw_ball(game.screen, ball, game.font_medium)
+        frame[0] += 1
+    return run
+
+
+def sprite_render(ring_step):
+    from render_cache import BallSpriteCache
+    sprites = BallSpriteCache()
+    sprites.ring_step = ring_step
+    return lambda: sprites.render((0, 100, 255), 80)
+
+
+for level in QUALITY_LEVELS:
+    benchmark(f"ball.render.{level.name}", number=50)(
+        lambda ring_step=level.ring_step: sprite_render(ring_step))
+
+
+@benchmark("ball.draw_frame", unit="frame")
+def bench_ball_frame():
+    module, game = make_game()
+    balls = fixed_balls()
+
+    def run():
+        for ball in balls:
+            ball.update()
+            module.draw_ball(game.screen, ball, game.font_medium)
+    return run
+
+
+@benchmark("background.gradient", unit="frame")
+def bench_background_gradient():
+    module, game = make_game()
+    game.background = BackgroundLayer(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    def run():
+        game.draw_background()
+        end_frame(game)
+    return run
+
+
+@benchmark("background.image", unit="frame")
+def bench_background_image():
+    module, game = make_game()
+    game.background = BackgroundLayer(SCREEN_WIDTH, SCREEN_HEIGHT, load_test_image())
+
+    def run():
+        game.draw_background()
+        end_frame(game)
+    return run
+
+
+@benchmark("legacy.background.gradient", unit="frame", number=30)
+def bench_legacy_gradient():
+    screen = pygame.display.get_surface()
+    return lambda: legacy_draw_background(screen, None, time.time())
+
+
+@benchmark("legacy.background.image", unit="frame", number=30)
+def bench_legacy_image():
+    screen = pygame.display.get_surface()
+    image = load_test_image()
+    return lambda: legacy_draw_background(screen, image, time.time())
+
+
+def starfield(count):
+    screen = pygame.display.get_surface()
+    stars = Starfield(SCREEN_WIDTH, SCREEN_HEIGHT, count, random.Random(SEED))
+
+    def run():
+        stars.update()
+        stars.draw(screen)
+    return run
+
+
+def legacy_starfield(count):
+    """The star dicts, sin calls and per-star circles Starfield replaced"""
+    screen = pygame.display.get_surface()
+    rng = random.Random(SEED)
+    stars = [{
+        'x': rng.randint(0, SCREEN_WIDTH),
+        'y': rng.randint(0, SCREEN_HEIGHT),
+        'brightness': 0,
+        'twinkle': rng.uniform(0, 2 * math.pi),
+        'size': rng.randint(1, 4)
+    } for _ in range(count)]
+
+    def run():
+        for star in stars:
+            star['twinkle'] += 0.05
+            star['brightness'] = int(150 + 105 * math.sin(star['twinkle']))
+        for star in stars:
+            color = (star['brightness'], star['brightness'], star['brightness'])
+            pygame.draw.circle(screen, color, (star['x'], star['y']), star['size'])
+    return run
+
+
+for name, count, number in (("", STAR_COUNT, 100), (f".{LARGE_STAR_COUNT}", LARGE_STAR_COUNT, 20)):
+    benchmark(f"starfield{name}", unit="frame", number=number)(lambda count=count: starfield(count))
+    benchmark(f"legacy.starfield{name}", unit="frame", number=number)(
+        lambda count=count: legacy_starfield(count))
+
+
+@benchmark("popup", unit="frame")
+def bench_popup():
+    module, game = make_game()
+    game.sim.selected_ball = fixed_balls(1)[0]
+    game.sim.input_text = "12"
+
+    def run():
+        game.draw_answer_popup()
+        end_frame(game)
+    return run
+
+
+@benchmark("menu.title", unit="frame")
+def bench_menu_title():
+    module, game = make_game()
+
+    def run():
+        game.menu_animation += 0.05
+        game.draw_menu()
+        end_frame(game)
+    return run
+
+
+@benchmark("hud", unit="frame", number=400)
+def bench_hud():
+    """The game HUD in steady state, with the time label ticking over"""
+    module, game = make_game()
+    sim = game.sim
+    start_round(sim)
+    frame = [0]
+
+    def run():
+        sim.time_left = 30 - frame[0] / 60
+        game.draw_hud()
+        frame[0] += 1
+        end_frame(game)
+    return run
+
+
+@benchmark("text.emoji", number=400)
+def bench_text_emoji():
+    module, game = make_game()
+    labels = ["💰 Score: 35", "⏰ Time: 17", "👤 bench", "🎯 Accuracy: 80%", "🎈 Active: 6"]
+    frame = [0]
+
+    def run():
+        game.draw_text_with_emoji(labels[frame[0] % len(labels)], game.font_large, module.WHITE, (25, 25))
+        frame[0] += 1
+        end_frame(game)
+    return run
+
+
+@benchmark("text.emoji_uncached", number=200)
+def bench_text_emoji_uncached():
+    module, game = make_game()
+
+    def run():
+        game.text_cache.clear()
+        game.draw_text_with_emoji("🎯 Accuracy: 80%", game.font_large, module.WHITE, (25, 25))
+        end_frame(game)
+    return run
+
+
+def particle_frame(emit, update, frame, live=PARTICLE_COUNT):
+    """Emit 25-particle bursts at the rate that holds `live` particles"""
+    colors = [(0, 255, 0), (255, 0, 0), (255, 255, 0)]
+    for i in range(max(1, live // (30 * 25))):
+        emit(colors[(frame + i) % 3], 25)
+    update()
+
+
+def steady_particles(emit, update, live=PARTICLE_COUNT):
+    """A frame callable, after the first bursts have lived out their 30 frames"""
+    frame = [0]
+
+    def run():
+        particle_frame(emit, update, frame[0], live)
+        frame[0] += 1
+    for _ in range(30):
+        run()
+    return run
+
+
+@benchmark("particles.update", unit="frame")
+def bench_particles_update():
+    system = ParticleSystem(rng=random.Random(SEED))
+    return steady_particles(lambda color, count: system.emit(650, 400, color, count), system.update)
+
+
+@benchmark("particles.draw", unit="frame")
+def bench_particles_draw():
+    screen = pygame.display.get_surface()
+    system = ParticleSystem(rng=random.Random(SEED))
+    for _ in range(30):
+        system.emit(650, 400, (0, 255, 0), PARTICLE_COUNT // 30)
+        system.update()
+    return lambda: system.draw(screen)
+
+
+def pooled_particles(live):
+    """Emit, update and draw with the particle system, `live` particles at a time"""
+    screen = pygame.display.get_surface()
+    system = ParticleSystem(capacity=live * 2, rng=random.Random(SEED))
+
+    def update():
+        system.update()
+        system.draw(screen)
+    return steady_particles(lambda color, count: system.emit(650, 400, color, count), update, live)
+
+
+def legacy_particles(live):
+    """The same frames with the Particle objects the system replaced"""
+    screen = pygame.display.get_surface()
+    rng = random.Random(SEED)
+    particles = []
+
+    def emit(color, count):
+        particles.extend(LegacyParticle(650, 400, color, rng) for _ in range(count))
+
+    def update():
+        for particle in particles[:]:
+            particle.update()
+            if particle.life <= 0:
+                particles.remove(particle)
+        for particle in particles:
+            particle.draw(screen)
+    return steady_particles(emit, update, live)
+
+
+for name, live, number in (("", PARTICLE_COUNT, 50), (".20k", LARGE_PARTICLE_COUNT, 10)):
+    benchmark(f"particles{name}", unit="frame", number=number)(lambda live=live: pooled_particles(live))
+    benchmark(f"legacy.particles{name}", unit="frame", number=number)(
+        lambda live=live: legacy_particles(live))
+
+
+def headless_round(max_balls):
+    def run():
+        sim = GameSimulation(seed=SEED, max_balls=max_balls)
+        player = ScriptedPlayer(sim)
+        start_round(sim)
+        while sim.state == "game":
+            player.act()
+            sim.tick()
+    return run
+
+
+@benchmark("round.headless", unit="round", number=3)
+def bench_round_headless():
+    return headless_round(MAX_BALLS)
+
+
+@benchmark("round.headless.storm", unit="round", number=1)
+def bench_round_headless_storm():
+    return headless_round(STORM_BALLS)
+
+
+@benchmark("round.replay", unit="round", number=3)
+def bench_round_replay():
+    # Record one scripted round, then time replaying it headless
+    path = os.path.join(tempfile.mkdtemp(), "round.mbr")
+    sim = GameSimulation(seed=SEED)
+    recorder = Recorder(sim, path)
+    player = ScriptedPlayer(sim, controls=recorder)
+    recorder.key_down(KEY_SPACE, " ")
+    for char in "bench":
+        recorder.key_down(KEY_OTHER, char)
+    recorder.key_down(KEY_RETURN)
+    while sim.state == "game":
+        player.act()
+        sim.tick()
+    recorder.close()
+    replay = Replay.load(path)
+    return lambda: replay_headless(replay)
+
+
+@benchmark("balls.click.storm", number=5000)
+def bench_balls_click_storm():
+    sim = GameSimulation(seed=SEED, max_balls=STORM_BALLS)
+    start_round(sim)
+    for _ in range(900):
+        sim.tick()
+    rng = random.Random(SEED)
+    clicks = [(rng.randint(0, SCREEN_WIDTH), rng.randint(0, SCREEN_HEIGHT)) for _ in range(256)]
+    frame = [0]
+
+    def run():
+        sim.balls.topmost_at(clicks[frame[0] % len(clicks)])
+        frame[0] += 1
+    return run
+
+
+@benchmark("problems.draw", number=10000)
+def bench_problems_draw():
+    deck = ProblemDeck(ProblemBank.load(BANK_PATH), random.Random(SEED))
+    return lambda: deck.bank.question(deck.draw())
+
+
+@benchmark("problems.load", unit="load", number=20)
+def bench_problems_load():
+    return lambda: ProblemBank.load(BANK_PATH)
+
+
+def scratch_leaderboard(rounds):
+    """A store of `rounds` rounds from rounds / 20 players, shared by the benchmarks"""
+    if rounds not in scratch_stores:
+        store = LeaderboardStore(os.path.join(tempfile.mkdtemp(), "leaderboard.db"))
+        rows = fake_rounds(rounds, max(1, rounds // 20), random.Random(SEED))
+        # Filling isn't timed, so it goes in big transactions
+        for _ in range(0, rounds, 10000):
+            store.add_rounds([row for _, row in zip(range(10000), rows)])
+        scratch_stores[rounds] = store
+    return scratch_stores[rounds]
+
+
+@benchmark("leaderboard.insert", unit="batch", number=20)
+def bench_leaderboard_insert():
+    # One writer-thread batch into a store already holding rounds
+    store = scratch_leaderboard(leaderboard_rounds)
+    rows = fake_rounds(BATCH_ROUNDS * 1000, 1000, random.Random(SEED))
+    return lambda: store.add_rounds([row for _, row in zip(range(BATCH_ROUNDS), rows)])
+
+
+@benchmark("leaderboard.top_players", unit="query", number=2000)
+def bench_leaderboard_top_players():
+    store = scratch_leaderboard(leaderboard_rounds)
+    return lambda: store.top_players(5)
+
+
+def rendered_round(max_balls, settle=0):
+    """One frame per call of a scripted round, after `settle` ticks"""
+    module, game = make_game(max_balls=max_balls)
+    sim = game.sim
+    player = ScriptedPlayer(sim)
+    start_round(sim)
+    for _ in range(settle):
+        sim.tick()
+
+    def run():
+        if sim.state != "game":
+            start_round(sim)
+        player.act()
+        game.update_fixed()
+        game.handle_sim_events()
+        game.draw_game()
+        end_frame(game)
+    return run
+
+
+@benchmark("round.rendered", unit="frame", number=300)
+def bench_round_rendered():
+    return rendered_round(MAX_BALLS)
+
+
+@benchmark("round.rendered.storm", unit="frame", number=100)
+def bench_round_rendered_storm():
+    # Long enough for the storm to fill the screen
+    return rendered_round(STORM_BALLS, settle=600)
+
+
+def startup(cold):
+    """Start a new process and time it up to its first presented frame.
+
+    The emoji font cache lives in a private file; cold runs delete it first
+    so every run pays for the system font scan.
+    """
+    cache_path = os.path.join(tempfile.mkdtemp(prefix="mathball-bench-"), "fonts.json")
+    env = dict(os.environ, MATHBALL_FONT_CACHE=cache_path)
+
+    def run():
+        if cold and os.path.exists(cache_path):
+            os.remove(cache_path)
+        subprocess.run([sys.executable, "-c", FIRST_FRAME_SCRIPT], cwd=BASE_DIR, env=env,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return run
+
+
+@benchmark("scheduler.jitter", unit="frame", number=1, self_timed=True)
+def bench_scheduler_jitter():
+    """p95 lateness of 60 Hz frames that each do 4 ms of work"""
+    def run():
+        scheduler = FrameScheduler(60)
+
+        async def frames():
+            for _ in range(120):
+                busy_until = time.perf_counter() + 0.004
+                while time.perf_counter() < busy_until:
+                    pass
+                await scheduler.wait()
+        asyncio.run(frames())
+        return scheduler.summary()["p95"]
+    return run
+
+
+def import_times(module):
+    """Cumulative import time in ms per module, from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BASE_DIR, check=True, capture_output=True, text=True)
+    times = {}
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            fields = line[len("import time:"):].split("|")
+            if fields[1].strip().isdigit():
+                times[fields[2].strip()] = int(fields[1]) / 1000
+    return times
+
+
+def import_time(module):
+    return lambda: import_times(module)[module]
+
+
+@benchmark("startup.import.game", unit="import", number=3, self_timed=True)
+def bench_import_game():
+    return import_time("math_ball_game")
+
+
+@benchmark("startup.import.simulation", unit="import", number=3, self_timed=True)
+def bench_import_simulation():
+    return import_time("simulation")
+
+
+@benchmark("startup.cold", unit="start", number=5)
+def bench_startup_cold():
+    return startup(cold=True)
+
+
+@benchmark("startup.warm", unit="start", number=5)
+def bench_startup_warm():
+    return startup(cold=False)
+
+
+def measure(setup, number, repeat, self_timed=False):
+    """Milliseconds per call for each of `repeat` batches of `number` calls"""
+    random.seed(SEED)
+    run = setup()
+    run()  # Warm caches and lazy setup
+    batches = []
+    for _ in range(repeat):
+        if self_timed:
+            batches.append(sum(run() for _ in range(number)) / number)
+            continue
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        batches.append((time.perf_counter() - start) * 1000 / number)
+    return batches
+
+
+def run_benchmarks(selected=None, repeat=5, scale=1.0):
+    global leaderboard_rounds
+    leaderboard_rounds = LEADERBOARD_ROUNDS if scale >= 1 else QUICK_LEADERBOARD_ROUNDS
+    results = {}
+    for name, (setup, unit, number, self_timed) in BENCHMARKS.items():
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        number = max(1, int(number * scale))
+        batches = measure(setup, number, repeat, self_timed)
+        results[name] = {
+            "unit": unit,
+            "median_ms": statistics.median(batches),
+            "min_ms": min(batches),
+            "max_ms": max(batches),
+            "calls": number * repeat
+        }
+        print(f"{name:<32}{results[name]['median_ms']:>10.3f} ms/{unit}", flush=True)
+    for store in scratch_stores.values():
+        store.close()
+    scratch_stores.clear()
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(map(str, pygame.get_sdl_version())),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "seed": SEED,
+        "ball_count": BALL_COUNT,
+        "particle_count": PARTICLE_COUNT,
+        "leaderboard_rounds": leaderboard_rounds,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print current vs baseline medians; returns the regressed benchmark names"""
+    regressions = []
+    print(f"\n{'benchmark':<32}{'baseline':>10}{'current':>10}{'change':>9}")
+    for name, current in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<32}{'-':>10}{current['median_ms']:>10.3f}{'new':>9}")
+            continue
+        change = current["median_ms"] / before["median_ms"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<32}{before['median_ms']:>10.3f}{current['median_ms']:>10.3f}{change:>+9.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Math Ball Catcher benchmarks")
+    parser.add_argument("--output", metavar="PATH", help="save results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before flagging, as a fraction (default 0.10)")
+    parser.add_argument("--filter", action="append", metavar="TEXT",
+                        help="only run benchmarks whose name contains TEXT")
+    parser.add_argument("--repeat", type=int, default=5, help="timed batches per benchmark")
+    parser.add_argument("--quick", action="store_true", help="run a tenth of the calls per batch")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    results = run_benchmarks(args.filter, args.repeat, 0.1 if args.quick else 1.0)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=1)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            status = 1
+    pygame.quit()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
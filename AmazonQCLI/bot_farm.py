@@ -0,0 +1,285 @@
+"""Play many headless rounds with bot players to see how scoring holds up.
+
+Each configuration describes a kind of player: how long they take to pick
+a ball, how fast they type, and how often they get each problem kind wrong.
+Bots play through the same inputs a person would, so the rounds follow the
+real rules, spawn rates and problem tiers. Every configuration plays the
+same seeds, so differences between them come from the players and not the
+luck of the draw.
+
+Rounds are split into chunks across a process pool. Workers send back only
+three small integer columns per chunk, so adding cores adds throughput
+almost linearly. The summary has one row per configuration: score and
+accuracy percentiles and the share of rounds reaching each game-over
+rating. It is written as CSV, or as columnar JSON if the path ends in .json.
+
+    python bot_farm.py --reaction 0.6 1.2 --typing 3 6 --error 0.05 0.2 \\
+        --rounds 10000 --output bots.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from problem_bank import KIND_NAMES, TIER_NAMES
+from simulation import (
+    KEY_OTHER, KEY_RETURN, MAX_BALLS, RATING_NAMES, SCREEN_HEIGHT, TICK_RATE, GameSimulation, rate
+)
+
+# Rounds each worker task plays; big enough that the pool's overhead vanishes
+CHUNK_ROUNDS = 50
+# Spread of a bot's reaction and keystroke times, as a share of their mean
+JITTER = 0.25
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# reaction: seconds to pick and click a ball once free
+# typing: answer keystrokes per second
+# errors: chance of a wrong answer for each problem kind, in KIND_NAMES order
+BotConfig = namedtuple("BotConfig", "reaction typing errors tiers max_balls")
+
+
+class Bot:
+    """Plays one round through the sim's inputs.
+
+    Clicks the lowest ball it can still answer before it falls away, types
+    the answer a key at a time, and presses return.
+    """
+
+    def __init__(self, sim, config, rng):
+        self.sim = sim
+        self.config = config
+        self.rng = rng
+        # Keystrokes left for the selected ball's answer
+        self.keys = []
+        self.wait = self.delay(config.reaction)
+
+    def delay(self, seconds):
+        """Ticks until the next action, about `seconds` away"""
+        return max(1, round(self.rng.gauss(seconds, seconds * JITTER) * TICK_RATE))
+
+    def act(self):
+        """Called before every tick"""
+        sim = self.sim
+        if sim.state != "game":
+            return
+        if self.wait > 0:
+            self.wait -= 1
+            return
+
+        if sim.selected_ball is None:
+            if self.keys:
+                # The ball fell away mid-answer
+                self.keys = []
+                self.wait = self.delay(self.config.reaction)
+                return
+            ball = self.pick()
+            if ball is not None:
+                sim.mouse_down((ball.x, ball.y))
+                # An overlapping ball spawned later may take the click; answer
+                # whatever was selected, as a person reading the popup would
+                if sim.selected_ball is not None:
+                    self.keys = list(self.respond(sim.selected_ball))
+                    self.wait = self.delay(1 / self.config.typing)
+        elif self.keys:
+            sim.key_down(KEY_OTHER, self.keys.pop(0))
+            self.wait = self.delay(1 / self.config.typing)
+        else:
+            sim.key_down(KEY_RETURN)
+            self.wait = self.delay(self.config.reaction)
+
+    def pick(self):
+        """The lowest visible ball with time left to answer it, if any"""
+        best = None
+        for ball in self.sim.balls:
+            if ball.y < 0:
+                continue
+            keys = len(str(ball.answer)) + 1
+            ticks_left = (SCREEN_HEIGHT + 100 - ball.y) / ball.speed
+            if ticks_left > keys * TICK_RATE / self.config.typing and (best is None or ball.y > best.y):
+                best = ball
+        return best
+
+    def respond(self, ball):
+        answer = ball.answer
+        if self.rng.random() < self.config.errors[ball.deck.bank.kinds[ball.problem]]:
+            answer += self.rng.choice((-1, 1)) * self.rng.randint(1, 9)
+        return str(answer)
+
+
+def play_round(config, seed):
+    """One full round with a bot; returns the finished sim"""
+    sim = GameSimulation(seed, tiers=config.tiers, max_balls=config.max_balls)
+    # The bot's own randomness stays apart from the game's
+    bot = Bot(sim, config, random.Random(f"bot{seed}"))
+    sim.player_name = "bot"
+    sim.start_round()
+    while sim.state == "game":
+        bot.act()
+        sim.tick()
+    return sim
+
+
+def play_chunk(task):
+    """Worker entry point: (config index, config, first seed, rounds) -> columns"""
+    index, config, first_seed, rounds = task
+    scores = array('i')
+    solved = array('H')
+    correct = array('H')
+    for seed in range(first_seed, first_seed + rounds):
+        sim = play_round(config, seed)
+        scores.append(sim.score)
+        solved.append(sim.problems_solved)
+        correct.append(sim.correct_answers)
+    return index, scores, solved, correct
+
+
+def percentiles(values):
+    values = sorted(values)
+    return [values[min(len(values) - 1, len(values) * p // 100)] for p in PERCENTILES]
+
+
+class Farm:
+    """Runs rounds for a list of configs and collects their result columns"""
+
+    def __init__(self, configs, rounds, seed=0, workers=None):
+        self.configs = configs
+        self.rounds = rounds
+        self.seed = seed
+        self.workers = workers or os.cpu_count() or 1
+        self.results = [(array('i'), array('H'), array('H')) for _ in configs]
+        self.elapsed = 0.0
+
+    def tasks(self):
+        for index, config in enumerate(self.configs):
+            for start in range(0, self.rounds, CHUNK_ROUNDS):
+                yield index, config, self.seed + start, min(CHUNK_ROUNDS, self.rounds - start)
+
+    def run(self):
+        start = time.perf_counter()
+        if self.workers == 1:
+            chunks = map(play_chunk, self.tasks())
+            self.collect(chunks)
+        else:
+            with ProcessPoolExecutor(self.workers) as pool:
+                self.collect(pool.map(play_chunk, self.tasks()))
+        self.elapsed = time.perf_counter() - start
+
+    def collect(self, chunks):
+        for index, scores, solved, correct in chunks:
+            columns = self.results[index]
+            columns[0].extend(scores)
+            columns[1].extend(solved)
+            columns[2].extend(correct)
+
+    def summary(self):
+        """Columns of per-config results, as a dict of equal-length lists"""
+        table = {}
+
+        def add(name, value):
+            table.setdefault(name, []).append(value)
+
+        for config, (scores, solved, correct) in zip(self.configs, self.results):
+            accuracies = [int(c / max(1, s) * 100) for s, c in zip(solved, correct)]
+            ratings = [0] * len(RATING_NAMES)
+            for score, accuracy in zip(scores, accuracies):
+                ratings[rate(score, accuracy)] += 1
+
+            add("reaction", config.reaction)
+            add("typing", config.typing)
+            for kind, name in enumerate(KIND_NAMES):
+                add(f"error_{name}", config.errors[kind])
+            add("tiers", "+".join(TIER_NAMES[tier] for tier in config.tiers or range(len(TIER_NAMES))))
+            add("max_balls", config.max_balls)
+            add("rounds", len(scores))
+            add("solved_mean", round(sum(solved) / len(solved), 2))
+            add("score_mean", round(sum(scores) / len(scores), 2))
+            for p, value in zip(PERCENTILES, percentiles(scores)):
+                add(f"score_p{p}", value)
+            add("accuracy_mean", round(sum(accuracies) / len(accuracies), 2))
+            for p, value in zip(PERCENTILES, percentiles(accuracies)):
+                add(f"accuracy_p{p}", value)
+            for name, count in zip(RATING_NAMES, ratings):
+                add(f"rated_{name}", round(count / len(scores), 4))
+        return table
+
+    def dump(self, path):
+        """Write the summary to CSV, or columnar JSON if the path ends in .json"""
+        table = self.summary()
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"seed": self.seed, "columns": table}, f, separators=(",", ":"))
+            return
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(table)
+            writer.writerows(zip(*table.values()))
+
+
+def parse_kind_error(text):
+    name, _, rate_text = text.partition("=")
+    if name not in KIND_NAMES:
+        raise argparse.ArgumentTypeError(f"unknown problem kind {name!r}; one of {', '.join(KIND_NAMES)}")
+    return KIND_NAMES.index(name), float(rate_text)
+
+
+def build_configs(args):
+    """Every combination of the swept settings"""
+    tiers = args.tiers and tuple(TIER_NAMES.index(tier) for tier in args.tiers)
+    configs = []
+    for reaction, typing, error, max_balls in itertools.product(
+            args.reaction, args.typing, args.error, args.max_balls):
+        errors = [error] * len(KIND_NAMES)
+        for kind, kind_rate in args.kind_error or ():
+            errors[kind] = kind_rate
+        configs.append(BotConfig(reaction, typing, tuple(errors), tiers, max_balls))
+    return configs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play headless rounds with bots and summarize the results")
+    parser.add_argument("--reaction", type=float, nargs="+", default=[1.0],
+                        help="seconds to pick a ball; several values are swept")
+    parser.add_argument("--typing", type=float, nargs="+", default=[4.0],
+                        help="keystrokes per second; several values are swept")
+    parser.add_argument("--error", type=float, nargs="+", default=[0.1],
+                        help="chance of a wrong answer; several values are swept")
+    parser.add_argument("--kind-error", type=parse_kind_error, action="append", metavar="KIND=RATE",
+                        help="error rate for one problem kind, e.g. div=0.3; repeatable")
+    parser.add_argument("--tier", action="append", choices=TIER_NAMES, dest="tiers",
+                        help="only ask problems of this difficulty; repeat to allow several")
+    parser.add_argument("--max-balls", type=int, nargs="+", default=[MAX_BALLS],
+                        help="ball cap; several values are swept")
+    parser.add_argument("--rounds", type=int, default=1000, help="rounds per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first round")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--output", metavar="PATH", help="write the summary (.csv, or .json)")
+    args = parser.parse_args(argv)
+
+    farm = Farm(build_configs(args), args.rounds, args.seed, args.workers)
+    farm.run()
+
+    total = len(farm.configs) * farm.rounds
+    rate_per_second = total / max(farm.elapsed, 1e-9)
+    print(f"{total} rounds in {farm.elapsed:.1f} s on {farm.workers} workers "
+          f"({rate_per_second:.0f} rounds/s, {rate_per_second / farm.workers:.0f} per worker)")
+    table = farm.summary()
+    shown = ("reaction", "typing", "error_add", "max_balls", "score_mean", "score_p50",
+             "accuracy_mean", "rated_genius", "rated_learner")
+    print("  ".join(f"{name:>13}" for name in shown))
+    for row in zip(*(table[name] for name in shown)):
+        print("  ".join(f"{value:>13}" for value in row))
+    if args.output:
+        farm.dump(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
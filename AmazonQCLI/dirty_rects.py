@@ -0,0 +1,39 @@
+import pygame
+
+
+class DirtyRectTracker:
+    """Screen regions drawn this frame and last frame, for partial presents.
+
+    Everything drawn over the background reports its rect through mark().
+    A region drawn last frame must be restored and presented again even if
+    nothing is drawn there now, so present() updates both sets of rects.
+    """
+
+    def __init__(self, screen_rect):
+        self.screen_rect = pygame.Rect(screen_rect)
+        self.current = []
+        self.previous = []
+        # The next frame has to be redrawn and presented in full
+        self.full = True
+        # Rects the last present() updated, or None if it flipped the whole screen
+        self.rects_presented = None
+
+    def mark(self, rect):
+        if rect:
+            self.current.append(rect)
+        return rect
+
+    def invalidate(self):
+        self.full = True
+
+    def present(self, partial=True):
+        if partial and not self.full:
+            rects = self.previous + self.current
+            pygame.display.update(rects)
+            self.rects_presented = len(rects)
+        else:
+            pygame.display.flip()
+            self.rects_presented = None
+        self.full = False
+        self.previous = self.current
+        self.current = []
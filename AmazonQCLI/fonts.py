@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import sys
+import time
+
+import pygame
+
+# Families tried in order for emoji-capable text
+EMOJI_FONT_NAMES = ('segoeuiemoji', 'applesymbol', 'notocoloremoji', 'symbola', 'dejavusans')
+FALLBACK_FONT_NAME = 'arial'
+EMOJI_PROBE = "🎮"
+PROBE_SIZE = 32
+CACHE_VERSION = 1
+
+logger = logging.getLogger("mathball.fonts")
+
+
+def default_cache_path():
+    """Per-user cache location; MATHBALL_FONT_CACHE overrides it"""
+    if os.environ.get("MATHBALL_FONT_CACHE"):
+        return os.environ["MATHBALL_FONT_CACHE"]
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, "mathball", "fonts.json")
+
+
+def font_dirs():
+    """Directories whose contents change when fonts are installed or removed"""
+    if sys.platform == "win32":
+        dirs = [os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts")]
+        if os.environ.get("LOCALAPPDATA"):
+            dirs.append(os.path.join(os.environ["LOCALAPPDATA"], "Microsoft", "Windows", "Fonts"))
+    elif sys.platform == "darwin":
+        dirs = ["/System/Library/Fonts", "/Library/Fonts", os.path.expanduser("~/Library/Fonts")]
+    else:
+        dirs = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts"),
+                os.path.expanduser("~/.local/share/fonts")]
+    return [path for path in dirs if os.path.isdir(path)]
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class FontResolver:
+    """Finds the emoji font without scanning the system's fonts every start.
+
+    pygame.font.SysFont builds its font table by scanning every installed
+    font (fc-list on Linux) on first use. The result of that scan for our
+    few families, and which of them renders emojis, is kept in a small
+    JSON file keyed by platform and font list. The file is trusted until
+    a resolved font file or a font directory changes its mtime.
+
+    Nothing is resolved until emoji_font() is first called; probe holds the
+    stored result and resolve_ms how long resolving took.
+    """
+
+    def __init__(self, names=EMOJI_FONT_NAMES, cache_path=None):
+        self.names = tuple(names)
+        self.cache_path = cache_path or default_cache_path()
+        self.probe = None
+        self.cache_hit = False
+        self.resolve_ms = None
+        self.fonts = {}
+
+    def key(self):
+        return f"{sys.platform}|pygame {pygame.version.ver}|{','.join(self.names)}"
+
+    def emoji_font(self, size=PROBE_SIZE):
+        """The emoji-capable font at `size`, or None; memoized per size"""
+        if size not in self.fonts:
+            probe = self.resolve()
+            try:
+                self.fonts[size] = pygame.font.Font(probe["path"], size)
+            except (pygame.error, OSError):
+                # The file went away since it was probed; look again next start
+                self.remove_cache()
+                self.fonts[size] = None
+        return self.fonts[size]
+
+    def resolve(self):
+        if self.probe is None:
+            start = time.perf_counter()
+            self.probe = self.load_cache()
+            self.cache_hit = self.probe is not None
+            if self.probe is None:
+                self.probe = self.scan()
+                self.save_cache()
+            self.resolve_ms = (time.perf_counter() - start) * 1000
+            logger.info("emoji font %s (%s) resolved in %.1f ms from %s",
+                        self.probe["name"], self.probe["path"] or "default",
+                        self.resolve_ms, "cache" if self.cache_hit else "font scan")
+        return self.probe
+
+    def scan(self):
+        """What SysFont would pick for each family, probed once for emojis"""
+        for name in self.names:
+            path = self.match(name)
+            try:
+                font = pygame.font.Font(path, PROBE_SIZE)
+                # Missing families fall back to the default font, as SysFont does
+                if font.render(EMOJI_PROBE, True, (255, 255, 255)).get_width() > 10:
+                    return self.result(name, path, True)
+            except (pygame.error, OSError):
+                continue
+        path = self.match(FALLBACK_FONT_NAME)
+        return self.result(FALLBACK_FONT_NAME, path, False)
+
+    def match(self, name):
+        try:
+            return pygame.sysfont.match_font(name)
+        except Exception:
+            return None
+
+    def result(self, name, path, renders_emoji):
+        return {
+            "name": name,
+            "path": path,
+            "renders_emoji": renders_emoji,
+            "mtimes": self.mtimes(path)
+        }
+
+    def mtimes(self, path):
+        paths = font_dirs() + ([path] if path else [])
+        return {p: mtime(p) for p in paths}
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("version") != CACHE_VERSION or cached.get("key") != self.key():
+            return None
+        probe = cached.get("probe")
+        if not probe or probe["mtimes"] != self.mtimes(probe["path"]):
+            return None
+        return probe
+
+    def save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "key": self.key(), "probe": self.probe}, f)
+        except OSError as e:
+            logger.info("could not write font cache %s: %s", self.cache_path, e)
+
+    def remove_cache(self):
+        try:
+            os.remove(self.cache_path)
+        except OSError:
+            pass
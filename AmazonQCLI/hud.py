@@ -0,0 +1,57 @@
+import pygame
+
+from assets import display_format
+
+_UNSET = object()
+
+
+class HudPanel:
+    """A HUD element kept as one surface, rebuilt only when its value changes.
+
+    build(value) returns the finished surface; draw() compares the bound
+    value with the one the surface was built for and otherwise just blits.
+    """
+
+    def __init__(self, pos, build):
+        self.pos = pos
+        self.build = build
+        self.value = _UNSET
+        self.surface = None
+        self.rebuilds = 0
+
+    def draw(self, screen, value):
+        if value != self.value:
+            self.surface = self.build(value)
+            self.value = value
+            self.rebuilds += 1
+        return screen.blit(self.surface, self.pos)
+
+
+class Hud:
+    """Named HUD panels; rebuilds counts panel rebuilds across all of them"""
+
+    def __init__(self):
+        self.panels = {}
+
+    def add(self, name, pos, build):
+        self.panels[name] = HudPanel(pos, build)
+
+    def draw(self, screen, name, value):
+        return self.panels[name].draw(screen, value)
+
+    @property
+    def rebuilds(self):
+        return sum(panel.rebuilds for panel in self.panels.values())
+
+
+def framed_panel(size, fill, border, border_width, text_surface, text_offset):
+    """A translucent box with an opaque border and text, as one alpha surface.
+
+    pygame.draw ignores the alpha of a color when drawing straight onto the
+    screen, so the box is filled on its own per-pixel alpha surface instead.
+    """
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    surface.fill(fill)
+    pygame.draw.rect(surface, border, surface.get_rect(), border_width)
+    surface.blit(text_surface, text_offset)
+    return display_format(surface, alpha=True)
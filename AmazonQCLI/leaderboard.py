@@ -0,0 +1,290 @@
+"""Finished rounds kept in SQLite, with the queries the game-over screen needs.
+
+Every round is stored, and a per-player table of totals and best score is
+kept up to date in the same transaction. All queries read from an index:
+the top rounds, the top players by best score or by accuracy, and one
+player's totals. They take about as long with millions of rounds (say,
+from classroom servers) as with a handful. The database runs in WAL mode,
+so several server processes can write to it while others read.
+
+The game talks to it through Leaderboard, which owns the connection on a
+background thread. The thread writes rounds in batches and answers queries
+with futures, so the frame loop never waits on the disk.
+
+    python leaderboard.py top
+    python leaderboard.py bench --rounds 1000000
+"""
+import argparse
+import logging
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from profiler import summarize
+
+# Queued rounds are written once this many pile up, or after FLUSH_SECONDS
+BATCH_ROUNDS = 256
+FLUSH_SECONDS = 1.0
+# Players need this many answers to be ranked by accuracy
+MIN_SOLVED = 20
+# How long a write waits on another process holding the lock
+BUSY_SECONDS = 30
+# Rounds in a benchmark's scratch database
+BENCH_ROUNDS = 1000000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    problems_solved INTEGER NOT NULL,
+    correct_answers INTEGER NOT NULL,
+    played_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rounds_score ON rounds (score DESC);
+
+CREATE TABLE IF NOT EXISTS players (
+    player TEXT PRIMARY KEY,
+    best_score INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    problems_solved INTEGER NOT NULL,
+    correct_answers INTEGER NOT NULL,
+    accuracy REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_best ON players (best_score DESC);
+CREATE INDEX IF NOT EXISTS players_accuracy ON players (accuracy DESC, problems_solved DESC);
+"""
+
+INSERT_ROUND = """
+INSERT INTO rounds (player, score, problems_solved, correct_answers, played_at)
+VALUES (?, ?, ?, ?, ?)
+"""
+# In the update, bare column names are the stored row's and excluded.* the new round's
+UPSERT_PLAYER = """
+INSERT INTO players (player, best_score, rounds, problems_solved, correct_answers, accuracy)
+VALUES (?, ?, 1, ?, ?, CAST(? AS REAL) / max(1, ?))
+ON CONFLICT (player) DO UPDATE SET
+    best_score = max(best_score, excluded.best_score),
+    rounds = rounds + 1,
+    problems_solved = problems_solved + excluded.problems_solved,
+    correct_answers = correct_answers + excluded.correct_answers,
+    accuracy = CAST(correct_answers + excluded.correct_answers AS REAL)
+               / max(1, problems_solved + excluded.problems_solved)
+"""
+
+logger = logging.getLogger("mathball.leaderboard")
+
+
+def default_path():
+    """Per-user data location; MATHBALL_LEADERBOARD overrides it"""
+    if os.environ.get("MATHBALL_LEADERBOARD"):
+        return os.environ["MATHBALL_LEADERBOARD"]
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    return os.path.join(base, "mathball", "leaderboard.db")
+
+
+class LeaderboardStore:
+    """The database itself; use it from one thread"""
+
+    def __init__(self, path):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=BUSY_SECONDS)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent at NORMAL; a crash can only
+        # lose the last few batches
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def add_rounds(self, rounds):
+        """Store (player, score, problems_solved, correct_answers, played_at) rows"""
+        with self.db:
+            self.db.executemany(INSERT_ROUND, rounds)
+            self.db.executemany(UPSERT_PLAYER, [(player, score, solved, correct, correct, solved)
+                                                for player, score, solved, correct, _ in rounds])
+
+    def top_rounds(self, k):
+        """The k highest-scoring rounds as (player, score, problems_solved, correct_answers)"""
+        return self.db.execute(
+            "SELECT player, score, problems_solved, correct_answers FROM rounds "
+            "ORDER BY score DESC LIMIT ?", (k,)).fetchall()
+
+    def top_players(self, k):
+        """The k players with the best rounds, as (player, best_score)"""
+        return self.db.execute(
+            "SELECT player, best_score FROM players ORDER BY best_score DESC LIMIT ?", (k,)).fetchall()
+
+    def top_accuracy(self, k, min_solved=MIN_SOLVED):
+        """The k most accurate players, as (player, accuracy %, problems_solved)"""
+        return [(player, round(accuracy * 100, 1), solved) for player, accuracy, solved in self.db.execute(
+            "SELECT player, accuracy, problems_solved FROM players WHERE problems_solved >= ? "
+            "ORDER BY accuracy DESC, problems_solved DESC LIMIT ?", (min_solved, k))]
+
+    def player(self, name):
+        """(best_score, rounds, problems_solved, correct_answers) of a player, or None"""
+        return self.db.execute(
+            "SELECT best_score, rounds, problems_solved, correct_answers FROM players WHERE player = ?",
+            (name,)).fetchone()
+
+    def rounds(self):
+        return self.db.execute("SELECT max(id) FROM rounds").fetchone()[0] or 0
+
+    def close(self):
+        self.db.close()
+
+
+class Leaderboard:
+    """A LeaderboardStore on its own thread.
+
+    record() only queues the round. The thread writes queued rounds in one
+    transaction once BATCH_ROUNDS have piled up or FLUSH_SECONDS have
+    passed, and before answering a query, so queries always see every round
+    recorded before them. Queries return a Future to poll from the frame
+    loop.
+    """
+
+    def __init__(self, path=None, batch=BATCH_ROUNDS, flush_seconds=FLUSH_SECONDS):
+        self.path = path or default_path()
+        self.batch = batch
+        self.flush_seconds = flush_seconds
+        self.requests = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="leaderboard", daemon=True)
+        self.thread.start()
+
+    def record(self, player, score, problems_solved, correct_answers):
+        self.requests.put((player, score, problems_solved, correct_answers, time.time()))
+
+    def query(self, name, *args):
+        """Call a LeaderboardStore query on the thread; returns a Future"""
+        future = Future()
+        self.requests.put((future, name, args))
+        return future
+
+    def top_players(self, k):
+        return self.query("top_players", k)
+
+    def close(self):
+        """Write what is still queued and stop the thread"""
+        self.requests.put(None)
+        self.thread.join()
+
+    def run(self):
+        try:
+            store = LeaderboardStore(self.path)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("leaderboard unavailable at %s: %s", self.path, e)
+            store = None
+
+        pending = []
+        while True:
+            try:
+                request = self.requests.get(timeout=self.flush_seconds) if pending else self.requests.get()
+            except queue.Empty:
+                # Nothing new for a while: write what is queued
+                request = ()
+            if request and not isinstance(request[0], Future):
+                pending.append(request)
+                if len(pending) < self.batch:
+                    continue
+
+            if pending and store is not None:
+                try:
+                    store.add_rounds(pending)
+                except sqlite3.Error as e:
+                    logger.warning("dropped %d leaderboard rounds: %s", len(pending), e)
+            pending = []
+            if request is None:
+                break
+            if request:
+                future, name, args = request
+                if store is None:
+                    future.set_exception(RuntimeError("leaderboard unavailable"))
+                    continue
+                try:
+                    future.set_result(getattr(store, name)(*args))
+                except sqlite3.Error as e:
+                    future.set_exception(e)
+
+        if store is not None:
+            store.close()
+
+
+def fake_rounds(count, players, rng):
+    """Plausible results from `players` students, for benchmarking"""
+    now = time.time()
+    for i in range(count):
+        solved = rng.randint(0, 40)
+        correct = rng.randint(0, solved)
+        yield (f"student{rng.randrange(players)}", correct * 5 - (solved - correct) * 2,
+               solved, correct, now + i)
+
+
+def bench(rounds, players, batch, queries):
+    """Insert throughput at batch size `batch`, then query latency at `rounds` rows"""
+    path = os.path.join(tempfile.mkdtemp(), "leaderboard.db")
+    store = LeaderboardStore(path)
+    rng = random.Random(1234)
+    rows = fake_rounds(rounds, players, rng)
+
+    start = time.perf_counter()
+    for _ in range(0, rounds, batch):
+        store.add_rounds([row for _, row in zip(range(batch), rows)])
+    elapsed = time.perf_counter() - start
+    print(f"inserted {rounds} rounds from {players} players in batches of {batch}: "
+          f"{rounds / elapsed:,.0f} rounds/s ({os.path.getsize(path) / 1e6:.0f} MB)")
+
+    for name, call in (("top_rounds(10)", lambda: store.top_rounds(10)),
+                       ("top_players(10)", lambda: store.top_players(10)),
+                       ("top_accuracy(10)", lambda: store.top_accuracy(10)),
+                       ("player", lambda: store.player(f"student{rng.randrange(players)}"))):
+        times = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            call()
+            times.append((time.perf_counter() - start) * 1000)
+        stats = summarize(times)
+        print(f"{name:<18} p50 {stats['p50']:.3f} ms   p99 {stats['p99']:.3f} ms")
+    store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or benchmark the Math Ball Catcher leaderboard")
+    parser.add_argument("command", choices=("top", "bench"), nargs="?", default="top",
+                        help="print the leaderboard, or benchmark a scratch database")
+    parser.add_argument("--path", help="database file (default: the game's)")
+    parser.add_argument("-k", type=int, default=10, help="rows per table")
+    parser.add_argument("--rounds", type=int, default=BENCH_ROUNDS, help="bench: rounds to insert")
+    parser.add_argument("--players", type=int, default=50000, help="bench: distinct players")
+    parser.add_argument("--batch", type=int, default=BATCH_ROUNDS, help="bench: rounds per transaction")
+    parser.add_argument("--queries", type=int, default=1000, help="bench: timed calls per query")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        bench(args.rounds, args.players, args.batch, args.queries)
+        return 0
+
+    store = LeaderboardStore(args.path or default_path())
+    print(f"{store.rounds()} rounds")
+    print("\nbest players")
+    for place, (player, score) in enumerate(store.top_players(args.k), 1):
+        print(f"{place:>3}. {player:<25} {score:>5}")
+    print(f"\nmost accurate (at least {MIN_SOLVED} answers)")
+    for place, (player, accuracy, solved) in enumerate(store.top_accuracy(args.k), 1):
+        print(f"{place:>3}. {player:<25} {accuracy:>5}%  of {solved}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,31 @@
+import argparse
 import asyncio
+import logging
 import pygame
-import random
 import math
 import time
 import sys
-import os
 
-# Initialize Pygame
-pygame.init()
-pygame.mixer.init()
+from assets import AssetManager, display_format
+from background import STAR_COUNT, BackgroundLayer, Starfield
+from dirty_rects import DirtyRectTracker
+from fonts import FontResolver
+from hud import Hud, framed_panel
+from leaderboard import Leaderboard
+from particles import ParticleSystem
+from problem_bank import TIER_NAMES
+from profiler import PHASES, FrameProfiler
+from quality import QUALITY_NAMES, QualityGovernor
+from render_cache import GlyphAtlas, TextCache, ball_sprites, hit_rate
+from replay import Recorder, Replay, ReplayFeeder
+from scheduler import FrameScheduler
+from simulation import (
+    EVENT_ANSWERED, EVENT_BALL_SELECTED, EVENT_QUIT, EVENT_RESTARTED, EVENT_ROUND_OVER,
+    EVENT_ROUND_STARTED, KEY_BACKSPACE, KEY_ESCAPE, KEY_OTHER, KEY_RETURN, KEY_SPACE,
+    MAX_BALLS, SCREEN_HEIGHT, SCREEN_WIDTH, STORM_BALLS, TICK_RATE, TICK_SECONDS, GameSimulation
+)
 
 # Constants
-SCREEN_WIDTH = 1300
-SCREEN_HEIGHT = 800
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 BLUE = (0, 100, 255)
@@ -24,203 +37,146 @@ ORANGE = (255, 165, 0)
 PINK = (255, 192, 203)
 CYAN = (0, 255, 255)
 
-class Particle:
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        self.vx = random.uniform(-3, 3)
-        self.vy = random.uniform(-5, -1)
-        self.life = 30
-        self.color = color
-        self.size = random.randint(2, 5)
-
-    def update(self):
-        self.x += self.vx
-        self.y += self.vy
-        self.vy += 0.1
-        self.life -= 1
-
-    def draw(self, screen):
-        if self.life > 0:
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.size)
-
-class MathBall:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.radius = random.randint(50, 80)
-        self.speed = random.uniform(1.5, 3.5)
-        self.color = random.choice([BLUE, GREEN, RED, YELLOW, PURPLE, ORANGE, PINK, CYAN])
-        self.pulse = 0
-        self.generate_problem()
-
-    def generate_problem(self):
-        """Generate medium-hard level math problems"""
-        problem_type = random.choice(['add', 'sub', 'mul', 'div', 'square', 'power', 'fraction', 'mixed'])
-
-        if problem_type == 'add':
-            self.num1 = random.randint(45, 150)
-            self.num2 = random.randint(35, 120)
-            self.answer = self.num1 + self.num2
-            self.question = f"{self.num1} + {self.num2}"
-
-        elif problem_type == 'sub':
-            self.num1 = random.randint(80, 200)
-            self.num2 = random.randint(30, self.num1 + 20)
-            self.answer = self.num1 - self.num2
-            self.question = f"{self.num1} - {self.num2}"
-
-        elif problem_type == 'mul':
-            self.num1 = random.randint(12, 25)
-            self.num2 = random.randint(11, 20)
-            self.answer = self.num1 * self.num2
-            self.question = f"{self.num1} x {self.num2}"
-
-        elif problem_type == 'div':
-            self.num2 = random.randint(8, 15)
-            self.answer = random.randint(12, 25)
-            self.num1 = self.num2 * self.answer
-            self.question = f"{self.num1} / {self.num2}"
-
-        elif problem_type == 'square':
-            self.num1 = random.randint(8, 15)
-            self.answer = self.num1 * self.num1
-            self.question = f"{self.num1}²"
-
-        elif problem_type == 'power':
-            base = random.randint(3, 8)
-            power = random.randint(2, 3)
-            self.answer = base ** power
-            self.question = f"{base}^{power}"
-
-        elif problem_type == 'fraction':
-            denominators = [2, 4, 5, 8, 10]
-            denom = random.choice(denominators)
-            numer = random.randint(1, denom * 3)
-            self.answer = int((numer / denom) * 100)
-            self.question = f"{numer}/{denom} as %"
-
-        else:  # mixed operations
-            operations = [
-                lambda: self.generate_mixed_add_mul(),
-                lambda: self.generate_mixed_sub_div(),
-                lambda: self.generate_mixed_parentheses()
-            ]
-            random.choice(operations)()
-
-    def generate_mixed_add_mul(self):
-        a = random.randint(10, 30)
-        b = random.randint(5, 12)
-        c = random.randint(3, 8)
-        self.answer = a + (b * c)
-        self.question = f"{a} + {b} x {c}"
-
-    def generate_mixed_sub_div(self):
-        c = random.randint(2, 6)
-        b = c * random.randint(4, 10)
-        a = random.randint(20, 50)
-        self.answer = a - (b // c)
-        self.question = f"{a} - {b} / {c}"
-
-    def generate_mixed_parentheses(self):
-        a = random.randint(8, 20)
-        b = random.randint(5, 15)
-        c = random.randint(3, 7)
-        self.answer = (a + b) * c
-        self.question = f"({a} + {b}) x {c}"
-
-    def update(self):
-        self.y += self.speed
-        self.pulse += 0.1
-
-    def draw(self, screen, font):
-        pulse_size = int(5 * math.sin(self.pulse))
-        current_radius = self.radius + pulse_size
-
-        # Draw ball with gradient effect
-        for i in range(current_radius):
-            color = tuple(max(0, min(255, c - i)) for c in self.color)
-            if i < current_radius:
-                pygame.draw.circle(screen, color, (int(self.x), int(self.y)), current_radius - i, 2)
-
-        # Draw outer glow
-        glow_color = tuple(min(255, c + 50) for c in self.color)
-        pygame.draw.circle(screen, glow_color, (int(self.x), int(self.y)), current_radius + 5, 3)
-
-        # Draw question text (clean, no shadow)
-        text = font.render(self.question, True, WHITE)
-        text_rect = text.get_rect(center=(self.x, self.y))
-        screen.blit(text, text_rect)
-
-    def is_clicked(self, pos):
-        distance = math.sqrt((pos[0] - self.x)**2 + (pos[1] - self.y)**2)
-        return distance <= self.radius
-
-    def is_out_of_bounds(self):
-        return self.y > SCREEN_HEIGHT + 100
+# Symbol stand-ins for emojis when no font can render them. The variation
+# selector is dropped so '⌨️' falls back to a plain '⌨'.
+EMOJI_FALLBACKS = str.maketrans({
+    '🎮': '♦', '🎯': '◎', '🧮': '≡', '⏰': '⌚', '🌟': '★', '🚀': '↑',
+    '💰': '$', '👤': '@', '🎈': 'O', '✅': '✓', '❌': '✗', '🤔': '?',
+    '\ufe0f': None, '🏆': '♔', '👏': '♪', '📚': '■', '🔄': '↻', '🎵': '♫',
+    '🔊': '♪', '🎨': '◊', '💻': '□', '👍': '+', '💪': '!', '📖': '▣',
+    '🧠': '◉', '🔥': '※', '💡': '◐', '🎓': '▲'
+})
+
+# Longest frame the update loop catches up on; anything slower plays in slow motion
+MAX_FRAME_TIME = 0.25
+# Answer field of the popup
+POPUP_INPUT_BOX = pygame.Rect(SCREEN_WIDTH//2 - 250, 400, 500, 100)
+# Frames between refreshes of the profiler overlay's numbers
+PROFILER_REFRESH = 30
+# Players listed on the game-over leaderboard
+LEADERBOARD_ROWS = 5
+# Game-over title, its color and a message for each of the sim's RATING_NAMES
+RATING_TEXT = (
+    ("🏆 MATH GENIUS! 🧠", YELLOW, "🌟 Outstanding mathematical mastery! 🌟"),
+    ("🔥 MATH EXPERT! 🔥", ORANGE, "⚡ Excellent problem-solving skills! ⚡"),
+    ("🌟 MATH SCHOLAR! 📚", GREEN, "👏 Great mathematical thinking! 👏"),
+    ("👍 MATH STUDENT! 📖", CYAN, "💪 Keep practicing those hard problems! 💪"),
+    ("🎯 MATH LEARNER! 🎓", PURPLE, "🚀 Challenge yourself with more practice! 🚀"),
+)
+
+logger = logging.getLogger("mathball.game")
+
+# pygame key codes the simulation cares about
+KEY_MAP = {
+    pygame.K_SPACE: KEY_SPACE,
+    pygame.K_RETURN: KEY_RETURN,
+    pygame.K_BACKSPACE: KEY_BACKSPACE,
+    pygame.K_ESCAPE: KEY_ESCAPE
+}
+
+def draw_ball(screen, ball, font, alpha=1.0):
+    """Draw a ball `alpha` of the way from its previous to its current tick"""
+    pulse_size = int(5 * math.sin(ball.pulse))
+    y = ball.prev_y + (ball.y - ball.prev_y) * alpha
+    center = (int(ball.x), int(y))
+
+    # Gradient rings and glow come pre-rendered from the shared sprite cache
+    sprite = ball_sprites.get(ball.color, ball.radius, pulse_size)
+    sprite_rect = screen.blit(sprite, sprite.get_rect(center=center))
+
+    # Draw question text (clean, no shadow), rendered once per ball
+    if ball.label is None or ball.label_font is not font:
+        ball.label = font.render(ball.question, True, WHITE)
+        ball.label_font = font
+    text_rect = ball.label.get_rect(center=(ball.x, y))
+    return sprite_rect.union(screen.blit(ball.label, text_rect))
 
 class MathBallGame:
-    def __init__(self):
+    def __init__(self, star_count=STAR_COUNT, dirty_rects=False, seed=None, fps=TICK_RATE,
+                 profile_dump=None, tiers=None, max_balls=MAX_BALLS, quality=None,
+                 record=None, replay=None, leaderboard=None):
+        self.init_subsystems()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("🎮 Math Ball Catcher - Medium-Hard Edition")
-        self.clock = pygame.time.Clock()
+        # Render frame cap; 0 renders as fast as possible
+        self.scheduler = FrameScheduler(fps)
+
+        # Frame phase timings; F3 shows them, profile_dump saves them at exit
+        self.profiler = FrameProfiler()
+        self.profile_dump = profile_dump
+        self.show_profiler = False
+        self.profiler_surface = None
+
+        # Dirty-rectangle presents (toggle with F2)
+        self.dirty = DirtyRectTracker(self.screen.get_rect())
+        self.dirty_rects = False
+        self.static_background = None
+        self.drawn_state = None
 
         # Load fonts
         self.load_fonts()
-
-        # Game state
-        self.state = "menu"
-        self.player_name = ""
-        self.score = 0
-        self.time_left = 90
-        self.start_time = 0
-        self.balls = []
-        self.input_text = ""
-        self.selected_ball = None
-        self.particles = []
-        self.stars = []
-        self.last_answer_correct = None
-        self.answer_feedback_timer = 0
-        self.problems_solved = 0
-        self.correct_answers = 0
+        self.text_cache = TextCache(self.render_text_with_emoji)
+        self.label_cache = TextCache(lambda text, font, color: font.render(text, True, color))
+        self.popup_chrome = None
+        self.atlases = {}
+        self.hud = self.build_hud()
+
+        # Game rules run headless on game time; this class only renders them
+        # A replay brings its own seed and settings and supplies the inputs
+        self.replay = None
+        if replay:
+            self.sim = replay.simulation()
+            self.replay = ReplayFeeder(replay, self.sim)
+        else:
+            self.sim = GameSimulation(seed, tiers=tiers, max_balls=max_balls)
+        # Live inputs go through here: the sim, or a Recorder logging them
+        self.controls = Recorder(self.sim, record) if record else self.sim
+
+        # Finished rounds are saved off the frame loop; the web build has no
+        # threads, so it goes without
+        self.leaderboard = None if sys.platform == "emscripten" else Leaderboard(leaderboard)
+        # Future of the top players, requested when a round ends
+        self.top_players = None
+        self.running = False
+        # Fraction of a tick between the last simulated step and this frame
+        self.alpha = 1.0
+        self.particles = ParticleSystem()
 
         # Animation variables
         self.menu_animation = 0
 
         # Create background elements
-        self.create_stars()
-
-        # Load audio and images
-        self.load_audio()
-        self.load_background_image()
-
-    def load_fonts(self):
-        """Load fonts with emoji support"""
+        self.starfield = Starfield(SCREEN_WIDTH, SCREEN_HEIGHT, star_count)
+
+        # Audio and images load in the background once run() starts
+        self.assets = AssetManager()
+        self.asset_task = None
+        self.has_bg_music = False
+        self.sound_correct = None
+        self.sound_wrong = None
+        self.sound_game_over = None
+        self.bg_image = None
+        self.has_bg_image = False
+        self.background = BackgroundLayer(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+        # Render detail follows frame times unless pinned to a level name
+        self.quality = QualityGovernor(fps, pinned=quality)
+        self.particle_share = 1.0
+        self.apply_quality(self.quality.level)
+        self.set_dirty_rects(dirty_rects)
+
+    def init_subsystems(self):
+        """Start only the SDL subsystems the game uses; sound is optional"""
+        pygame.display.init()
+        pygame.font.init()
         try:
-            # Try to load system fonts that support emojis
-            font_names = ['segoeuiemoji', 'applesymbol', 'notocoloremoji', 'symbola', 'dejavusans']
-
-            self.emoji_font = None
-            for font_name in font_names:
-                try:
-                    test_font = pygame.font.SysFont(font_name, 32)
-                    # Test if it can render emojis
-                    test_surface = test_font.render("🎮", True, WHITE)
-                    if test_surface.get_width() > 10:  # If emoji rendered properly
-                        self.emoji_font = test_font
-                        break
-                except:
-                    continue
-
-            # If no emoji font found, try default system font
-            if not self.emoji_font:
-                try:
-                    self.emoji_font = pygame.font.SysFont('arial', 32)
-                except:
-                    self.emoji_font = None
+            pygame.mixer.init()
+        except pygame.error as e:
+            logger.warning("no audio, playing without sound: %s", e)
 
-        except:
-            self.emoji_font = None
+    def load_fonts(self):
+        """Load fonts; the emoji font is resolved on first use"""
+        self.font_resolver = FontResolver()
 
         # Regular fonts
         self.font_large = pygame.font.Font(None, 42)
@@ -229,78 +185,66 @@ class MathBallGame:
         self.font_title = pygame.font.Font(None, 84)
         self.font_huge = pygame.font.Font(None, 120)
 
+    @property
+    def emoji_font(self):
+        return self.font_resolver.emoji_font()
+
     def draw_text_with_emoji(self, text, font, color, pos):
-        """Draw text with emoji support - ONLY CHANGED THIS FUNCTION"""
+        """Draw text with emoji support, reusing cached renders"""
+        rendered_text = self.text_cache.get(text, font, color)
+        return self.blit(rendered_text, pos)
+
+    def atlas(self, font, color):
+        """Shared glyph atlas for animated text in one font and color"""
+        key = (font, color)
+        if key not in self.atlases:
+            self.atlases[key] = GlyphAtlas(font, color)
+        return self.atlases[key]
+
+    def blit(self, surface, dest):
+        """Blit to the screen and mark the region dirty"""
+        return self.dirty.mark(self.screen.blit(surface, dest))
+
+    def render_text_with_emoji(self, text, font, color):
+        """Render text with the first font that can handle it"""
         # First try to render with emoji font
         if self.emoji_font:
             try:
-                rendered_text = self.emoji_font.render(text, True, color)
-                self.screen.blit(rendered_text, pos)
-                return
-            except:
+                return self.emoji_font.render(text, True, color)
+            except Exception:
                 pass
 
         # If emoji font fails, try regular font with original emojis
         try:
-            rendered_text = font.render(text, True, color)
-            self.screen.blit(rendered_text, pos)
-            return
-        except:
+            return font.render(text, True, color)
+        except Exception:
             pass
 
         # Final fallback: replace emojis with symbols
-        icon_replacements = {
-            '🎮': '♦', '🎯': '◎', '🧮': '≡', '⏰': '⌚', '🌟': '★', '🚀': '↑',
-            '💰': '$', '👤': '@', '🎈': 'O', '✅': '✓', '❌': '✗', '🤔': '?',
-            '⌨️': '⌨', '🏆': '♔', '👏': '♪', '📚': '■', '🔄': '↻', '🎵': '♫',
-            '🔊': '♪', '🎨': '◊', '💻': '□', '👍': '+', '💪': '!', '📖': '▣',
-            '🧠': '◉', '⚡': '⚡', '🔥': '※', '💡': '◐', '🎓': '▲'
-        }
-
-        display_text = text
-        for emoji, replacement in icon_replacements.items():
-            display_text = display_text.replace(emoji, replacement)
-
-        rendered_text = font.render(display_text, True, color)
-        self.screen.blit(rendered_text, pos)
-
-    def load_audio(self):
-        """Load audio files if they exist"""
-        try:
-            if os.path.exists("background_music.mp3"):
-                pygame.mixer.music.load("background_music.mp3")
-                self.has_bg_music = True
-            elif os.path.exists("background_music.wav"):
-                pygame.mixer.music.load("background_music.wav")
-                self.has_bg_music = True
-            else:
-                self.has_bg_music = False
-
-            self.sound_correct = pygame.mixer.Sound("correct.wav") if os.path.exists("correct.wav") else None
-            self.sound_wrong = pygame.mixer.Sound("wrong.wav") if os.path.exists("wrong.wav") else None
-            self.sound_game_over = pygame.mixer.Sound("game_over.wav") if os.path.exists("game_over.wav") else None
-
-        except Exception as e:
-            self.has_bg_music = False
-            self.sound_correct = None
-            self.sound_wrong = None
-            self.sound_game_over = None
-
-    def load_background_image(self):
-        """Load background image if it exists"""
-        try:
-            if os.path.exists("background.jpg"):
-                self.bg_image = pygame.image.load("background.jpg")
-                self.bg_image = pygame.transform.scale(self.bg_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-                self.has_bg_image = True
-            elif os.path.exists("background.png"):
-                self.bg_image = pygame.image.load("background.png")
-                self.bg_image = pygame.transform.scale(self.bg_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-                self.has_bg_image = True
-            else:
-                self.has_bg_image = False
-        except Exception as e:
-            self.has_bg_image = False
+        return font.render(text.translate(EMOJI_FALLBACKS), True, color)
+
+    def render_text(self, text, font, color):
+        """Render plain text through the label cache"""
+        return self.label_cache.get(text, font, color)
+
+    async def load_assets(self):
+        """Load images and audio while the menu is already showing"""
+        self.bg_image = await self.assets.load_image("background.jpg", "background.png",
+                                                     size=(SCREEN_WIDTH, SCREEN_HEIGHT))
+        if self.bg_image is not None:
+            self.has_bg_image = True
+            self.background.set_image(self.bg_image)
+            if self.dirty_rects:
+                # Rebuild the static layer on top of the image
+                self.set_dirty_rects(True)
+
+        self.sound_correct = await self.assets.load_sound("correct.wav")
+        self.sound_wrong = await self.assets.load_sound("wrong.wav")
+        self.sound_game_over = await self.assets.load_sound("game_over.wav")
+
+        self.has_bg_music = await self.assets.load_music("background_music.mp3", "background_music.wav")
+        if self.sim.state == "game":
+            self.start_background_music()
 
     def play_sound(self, sound_type):
         """Play sound effects"""
@@ -322,78 +266,90 @@ class MathBallGame:
         except Exception as e:
             pass
 
-    def create_stars(self):
-        for _ in range(200):
-            star = {
-                'x': random.randint(0, SCREEN_WIDTH),
-                'y': random.randint(0, SCREEN_HEIGHT),
-                'brightness': random.randint(100, 255),
-                'twinkle': random.uniform(0, 2 * math.pi),
-                'size': random.randint(1, 4)
-            }
-            self.stars.append(star)
-
-    def update_stars(self):
-        for star in self.stars:
-            star['twinkle'] += 0.05
-            star['brightness'] = int(150 + 105 * math.sin(star['twinkle']))
+    def apply_quality(self, level):
+        ball_sprites.set_ring_step(level.ring_step)
+        self.starfield.visible = int(self.starfield.count * level.stars)
+        self.particle_share = level.particles
+        self.background.animate = level.animate_background
+        if self.dirty_rects:
+            # Refreeze the static layer with the new star count
+            self.set_dirty_rects(True)
+
+    def set_dirty_rects(self, enabled):
+        """Switch between full-frame flips and dirty-rectangle updates.
+
+        In dirty-rectangle mode the background and stars are frozen into a
+        static layer, so only the regions drawn over it need presenting.
+        """
+        self.dirty_rects = enabled
+        self.static_background = None
+        if enabled:
+            # The gradient is only composed on update; it may not have run yet
+            self.background.update(time.time())
+            self.static_background = self.background.surface.copy()
+            self.starfield.draw(self.static_background)
+        self.dirty.invalidate()
+
+    def restore_background(self):
+        """Repaint last frame's dirty regions from the static layer"""
+        if self.sim.state != self.drawn_state:
+            self.drawn_state = self.sim.state
+            self.dirty.invalidate()
+
+        if self.dirty.full:
+            self.screen.blit(self.static_background, (0, 0))
+        else:
+            for rect in self.dirty.previous:
+                self.screen.blit(self.static_background, rect, rect)
+
+    def present(self):
+        self.dirty.present(partial=self.dirty_rects)
 
     def draw_background(self):
-        if self.has_bg_image:
-            self.screen.blit(self.bg_image, (0, 0))
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            overlay.set_alpha(120)
-            overlay.fill((0, 0, 60))
-            self.screen.blit(overlay, (0, 0))
-        else:
-            for y in range(SCREEN_HEIGHT):
-                color_ratio = y / SCREEN_HEIGHT
-                time_offset = math.sin(time.time() * 0.3) * 0.3
-                r = max(0, min(255, int(25 + (50 * (color_ratio + time_offset)))))
-                g = max(0, min(255, int(35 + (70 * (color_ratio + time_offset)))))
-                b = max(0, min(255, int(90 + (140 * (color_ratio + time_offset)))))
-                pygame.draw.line(self.screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+        if self.dirty_rects:
+            self.restore_background()
+            self.profiler.lap("background")
+            return
+
+        # Gradient or tinted image, composed once and reused across frames
+        self.background.draw(self.screen, time.time())
 
         # Draw twinkling stars
-        self.update_stars()
-        for star in self.stars:
-            color = (star['brightness'], star['brightness'], star['brightness'])
-            pygame.draw.circle(self.screen, color, (star['x'], star['y']), star['size'])
+        self.starfield.draw(self.screen)
+        self.profiler.lap("background")
 
     def create_particle_explosion(self, x, y, color, count=15):
-        for _ in range(count):
-            self.particles.append(Particle(x, y, color))
+        self.particles.emit(x, y, color, max(1, round(count * self.particle_share)))
 
     def update_particles(self):
-        for particle in self.particles[:]:
-            particle.update()
-            if particle.life <= 0:
-                self.particles.remove(particle)
+        self.particles.update()
 
     def draw_particles(self):
-        for particle in self.particles:
-            particle.draw(self.screen)
+        self.dirty.mark(self.particles.draw(self.screen))
+        self.profiler.lap("particles")
 
     def draw_menu(self):
         self.draw_background()
-        self.menu_animation += 0.02
 
         # Animated title with rainbow effect
         title_y = 160 + math.sin(self.menu_animation) * 20
         colors = [RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, PURPLE, PINK]
         title_text = "MATH BALL CATCHER"
 
-        for i, char in enumerate(title_text):
-            color = colors[i % len(colors)]
-            char_surface = self.font_title.render(char, True, color)
-            char_y = title_y + math.sin(self.menu_animation + i * 0.4) * 15
-            char_x = 280 + i * 45
-            self.screen.blit(char_surface, (char_x, char_y))
+        # Letters cycle through the colors, so each color's atlas draws every
+        # len(colors)-th letter, starting from its first one
+        step = len(colors)
+        for first, color in enumerate(colors):
+            def wave(i, first=first):
+                return 0, math.sin(self.menu_animation + (first + i * step) * 0.4) * 15
+            atlas = self.atlas(self.font_title, color)
+            self.dirty.mark(atlas.draw(self.screen, title_text[first::step], (280 + first * 45, title_y),
+                                       spacing=45 * step, offsets=wave))
 
         # Subtitle
-        subtitle_surface = self.font_large.render("MEDIUM-HARD EDITION", True, YELLOW)
+        subtitle_surface = self.render_text("MEDIUM-HARD EDITION", self.font_large, YELLOW)
         subtitle_rect = subtitle_surface.get_rect(center=(SCREEN_WIDTH//2, title_y + 100))
-        self.screen.blit(subtitle_surface, subtitle_rect)
+        self.blit(subtitle_surface, subtitle_rect)
 
         # Instructions
         instructions = [
@@ -423,79 +379,97 @@ class MathBallGame:
 
         # Input box
         input_box = pygame.Rect(SCREEN_WIDTH//2 - 220, 360, 440, 70)
-        pygame.draw.rect(self.screen, WHITE, input_box)
+        self.dirty.mark(pygame.draw.rect(self.screen, WHITE, input_box))
         pygame.draw.rect(self.screen, BLUE, input_box, 5)
 
         # Input text with cursor
-        display_name = self.player_name + ("|" if int(time.time() * 2) % 2 else "")
-        text = self.font_large.render(display_name, True, BLACK)
+        display_name = self.sim.player_name + ("|" if int(time.time() * 2) % 2 else "")
+        text = self.render_text(display_name, self.font_large, BLACK)
         text_rect = text.get_rect(center=input_box.center)
-        self.screen.blit(text, text_rect)
+        self.blit(text, text_rect)
 
         # Instructions
-        instruction = self.font_small.render("Press ENTER to start your mathematical journey!", True, WHITE)
+        instruction = self.render_text("Press ENTER to start your mathematical journey!", self.font_small, WHITE)
         instruction_rect = instruction.get_rect(center=(SCREEN_WIDTH//2, 480))
-        self.screen.blit(instruction, instruction_rect)
+        self.blit(instruction, instruction_rect)
 
     def draw_game(self):
         self.draw_background()
-        self.update_particles()
         self.draw_particles()
 
-        # Draw balls
-        for ball in self.balls:
-            ball.draw(self.screen, self.font_medium)
-
-        # UI elements
-        # Score display
-        score_bg = pygame.Rect(15, 15, 300, 55)
-        pygame.draw.rect(self.screen, (0, 0, 0, 180), score_bg)
-        pygame.draw.rect(self.screen, YELLOW, score_bg, 4)
-
-        score_color = GREEN if self.score >= 0 else RED
-        self.draw_text_with_emoji(f"💰 Score: {self.score}", self.font_large, score_color, (25, 25))
+        # Draw balls, newest on top as clicks see them
+        ball_sprites.begin_frame()
+        for ball in self.sim.balls.in_spawn_order():
+            self.dirty.mark(draw_ball(self.screen, ball, self.font_medium, self.alpha))
+        self.profiler.lap("balls")
 
-        # Time display
-        time_bg = pygame.Rect(15, 80, 300, 55)
-        time_color = RED if self.time_left < 20 else ORANGE if self.time_left < 45 else GREEN
-
-        pygame.draw.rect(self.screen, (0, 0, 0, 180), time_bg)
-        pygame.draw.rect(self.screen, time_color, time_bg, 4)
-
-        self.draw_text_with_emoji(f"⏰ Time: {int(self.time_left)}", self.font_large, time_color, (25, 90))
-
-        # Player name
-        name_bg = pygame.Rect(15, 150, 300, 55)
-        pygame.draw.rect(self.screen, (0, 0, 0, 180), name_bg)
-        pygame.draw.rect(self.screen, CYAN, name_bg, 4)
-        self.draw_text_with_emoji(f"👤 {self.player_name}", self.font_medium, WHITE, (25, 163))
-
-        # Statistics
-        stats_bg = pygame.Rect(15, 220, 300, 55)
-        pygame.draw.rect(self.screen, (0, 0, 0, 180), stats_bg)
-        pygame.draw.rect(self.screen, PURPLE, stats_bg, 4)
-        accuracy = int((self.correct_answers / max(1, self.problems_solved)) * 100)
-        self.draw_text_with_emoji(f"🎯 Accuracy: {accuracy}%", self.font_medium, WHITE, (25, 230))
-
-        # Ball count and difficulty
-        self.draw_text_with_emoji(f"🎈 Active: {len(self.balls)}", self.font_small, WHITE,
-                                (SCREEN_WIDTH - 180, 25))
+        self.draw_hud()
 
         # Answer feedback (clean, no black overlay)
-        if self.answer_feedback_timer > 0:
+        if self.sim.answer_feedback_timer > 0:
             self.draw_answer_feedback()
-            self.answer_feedback_timer -= 1
+
+        self.profiler.lap("hud")
 
         # Answer popup
-        if self.selected_ball:
+        if self.sim.selected_ball:
             self.draw_answer_popup()
+            self.profiler.lap("popup")
+
+    def build_hud(self):
+        """HUD panels for draw_game, keyed by the value each one shows"""
+        hud = Hud()
+
+        def panel(border, text, font, color, text_offset=(10, 10)):
+            return framed_panel((300, 55), (0, 0, 0, 180), border, 4,
+                                self.render_text_with_emoji(text, font, color), text_offset)
+
+        def score(value):
+            color = GREEN if value >= 0 else RED
+            return panel(YELLOW, f"💰 Score: {value}", self.font_large, color)
+
+        def time_left(value):
+            color = RED if value < 20 else ORANGE if value < 45 else GREEN
+            return panel(color, f"⏰ Time: {value}", self.font_large, color)
+
+        hud.add("score", (15, 15), score)
+        hud.add("time", (15, 80), time_left)
+        hud.add("player", (15, 150), lambda value: panel(CYAN, f"👤 {value}", self.font_medium, WHITE, (10, 13)))
+        hud.add("accuracy", (15, 220),
+                lambda value: panel(PURPLE, f"🎯 Accuracy: {value}%", self.font_medium, WHITE))
+        hud.add("active", (SCREEN_WIDTH - 180, 25),
+                lambda value: self.render_text_with_emoji(f"🎈 Active: {value}", self.font_small, WHITE))
+
+        def leaderboard(rows):
+            # rows is None while the query is running
+            lines = ["🏆 Top Players"]
+            if rows is None:
+                lines.append("...")
+            else:
+                lines += [f"{place}. {player[:16]}  {score}" for place, (player, score) in enumerate(rows, 1)]
+            text = pygame.Surface((280, 32 * len(lines)), pygame.SRCALPHA)
+            for row, line in enumerate(lines):
+                color = YELLOW if row == 0 else WHITE
+                text.blit(self.render_text_with_emoji(line, self.font_small, color), (0, 32 * row))
+            return framed_panel((300, text.get_height() + 16), (0, 0, 0, 180), YELLOW, 4, text, (10, 10))
+
+        hud.add("leaderboard", (SCREEN_WIDTH - 320, 220), leaderboard)
+        return hud
+
+    def draw_hud(self):
+        """Score, time, player, accuracy and ball count; one blit each"""
+        sim = self.sim
+        for name, value in (("score", sim.score), ("time", int(sim.time_left)),
+                            ("player", sim.player_name), ("accuracy", sim.accuracy),
+                            ("active", len(sim.balls))):
+            self.dirty.mark(self.hud.draw(self.screen, name, value))
 
     def draw_answer_feedback(self):
         """Draw clean feedback for correct/wrong answers"""
-        if self.last_answer_correct is not None:
+        if self.sim.last_answer_correct is not None:
             feedback_y = 180 + math.sin(time.time() * 10) * 15
 
-            if self.last_answer_correct:
+            if self.sim.last_answer_correct:
                 feedback_text = "CORRECT! +5 points"
                 feedback_color = GREEN
             else:
@@ -503,16 +477,16 @@ class MathBallGame:
                 feedback_color = RED
 
             # Clean text display (no black overlay)
-            text_surface = self.font_large.render(feedback_text, True, feedback_color)
+            text_surface = self.render_text(feedback_text, self.font_large, feedback_color)
             text_rect = text_surface.get_rect(center=(SCREEN_WIDTH//2, feedback_y))
-            self.screen.blit(text_surface, text_rect)
+            self.blit(text_surface, text_rect)
+
+    def build_popup_chrome(self):
+        """Overlay, box, input field and fixed labels of the answer popup"""
+        chrome = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
 
-    def draw_answer_popup(self):
         # Semi-transparent overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(200)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        chrome.fill((0, 0, 0, 200))
 
         # Popup box
         popup_box = pygame.Rect(SCREEN_WIDTH//2 - 500, 220, 1000, 450)
@@ -523,73 +497,60 @@ class MathBallGame:
             r = max(0, min(255, int(60 + (120 * color_ratio))))
             g = max(0, min(255, int(30 + (90 * color_ratio))))
             b = max(0, min(255, int(120 + (180 * color_ratio))))
-            pygame.draw.line(self.screen, (r, g, b),
+            pygame.draw.line(chrome, (r, g, b),
                            (popup_box.x, popup_box.y + i),
                            (popup_box.x + popup_box.width, popup_box.y + i))
 
         # Border
-        pygame.draw.rect(self.screen, WHITE, popup_box, 5)
+        pygame.draw.rect(chrome, WHITE, popup_box, 5)
 
         # Difficulty indicator
-        self.draw_text_with_emoji("🧠 HARD PROBLEM 🔥", self.font_medium, ORANGE,
-                                (SCREEN_WIDTH//2 - 175, 250))
-
-        # Question display (clean, no black text)
-        question_text = f"{self.selected_ball.question} = ?"
-        text_surface = self.font_huge.render(question_text, True, YELLOW)
-        text_rect = text_surface.get_rect(center=(SCREEN_WIDTH//2, 340))
-        self.screen.blit(text_surface, text_rect)
+        chrome.blit(self.text_cache.get("🧠 HARD PROBLEM 🔥", self.font_medium, ORANGE),
+                    (SCREEN_WIDTH//2 - 175, 250))
 
         # Answer input box
-        input_box = pygame.Rect(SCREEN_WIDTH//2 - 250, 400, 500, 100)
-        pygame.draw.rect(self.screen, WHITE, input_box)
-        pygame.draw.rect(self.screen, BLUE, input_box, 5)
-
-        # Input text with cursor
-        display_text = self.input_text + ("|" if int(time.time() * 4) % 2 else "")
-        text = self.font_large.render(display_text, True, BLACK)
-        text_rect = text.get_rect(center=input_box.center)
-        self.screen.blit(text, text_rect)
+        pygame.draw.rect(chrome, WHITE, POPUP_INPUT_BOX)
+        pygame.draw.rect(chrome, BLUE, POPUP_INPUT_BOX, 5)
 
         # Instructions
-        self.draw_text_with_emoji("⌨️ Type your answer and press ENTER", self.font_medium, WHITE,
-                                (SCREEN_WIDTH//2 - 275, 540))
+        chrome.blit(self.text_cache.get("⌨️ Type your answer and press ENTER", self.font_medium, WHITE),
+                    (SCREEN_WIDTH//2 - 275, 540))
 
         # Hint
-        self.draw_text_with_emoji("💡 Remember: Order of operations matters!", self.font_small, CYAN,
-                                (SCREEN_WIDTH//2 - 275, 570))
+        chrome.blit(self.text_cache.get("💡 Remember: Order of operations matters!", self.font_small, CYAN),
+                    (SCREEN_WIDTH//2 - 275, 570))
+
+        return display_format(chrome, alpha=True)
+
+    def draw_answer_popup(self):
+        # Everything but the question and the typed answer is drawn once
+        if self.popup_chrome is None:
+            self.popup_chrome = self.build_popup_chrome()
+        self.blit(self.popup_chrome, (0, 0))
+
+        # Question display (clean, no black text)
+        question_text = f"{self.sim.selected_ball.question} = ?"
+        atlas = self.atlas(self.font_huge, YELLOW)
+        text_rect = pygame.Rect((0, 0), atlas.size(question_text))
+        text_rect.center = (SCREEN_WIDTH//2, 340)
+        self.dirty.mark(atlas.draw(self.screen, question_text, text_rect.topleft))
+
+        # Input text with cursor
+        display_text = self.sim.input_text + ("|" if int(time.time() * 4) % 2 else "")
+        text = self.render_text(display_text, self.font_large, BLACK)
+        text_rect = text.get_rect(center=POPUP_INPUT_BOX.center)
+        self.blit(text, text_rect)
 
     def draw_game_over(self):
         self.draw_background()
-        self.update_particles()
         self.draw_particles()
 
         # Game over text
         game_over_y = 120 + math.sin(time.time() * 2) * 15
 
         # Performance-based message
-        accuracy = int((self.correct_answers / max(1, self.problems_solved)) * 100)
-
-        if self.score >= 150 and accuracy >= 80:
-            title = "🏆 MATH GENIUS! 🧠"
-            title_color = YELLOW
-            message = "🌟 Outstanding mathematical mastery! 🌟"
-        elif self.score >= 100 and accuracy >= 70:
-            title = "🔥 MATH EXPERT! 🔥"
-            title_color = ORANGE
-            message = "⚡ Excellent problem-solving skills! ⚡"
-        elif self.score >= 60 and accuracy >= 60:
-            title = "🌟 MATH SCHOLAR! 📚"
-            title_color = GREEN
-            message = "👏 Great mathematical thinking! 👏"
-        elif self.score >= 30:
-            title = "👍 MATH STUDENT! 📖"
-            title_color = CYAN
-            message = "💪 Keep practicing those hard problems! 💪"
-        else:
-            title = "🎯 MATH LEARNER! 🎓"
-            title_color = PURPLE
-            message = "🚀 Challenge yourself with more practice! 🚀"
+        accuracy = self.sim.accuracy
+        title, title_color, message = RATING_TEXT[self.sim.rating]
 
         # Title
         self.draw_text_with_emoji(title, self.font_title, title_color,
@@ -599,15 +560,15 @@ class MathBallGame:
         stats_y = 220
 
         # Final score
-        self.draw_text_with_emoji(f"🎯 Final Score: {self.score} points", self.font_large, WHITE,
+        self.draw_text_with_emoji(f"🎯 Final Score: {self.sim.score} points", self.font_large, WHITE,
                                 (SCREEN_WIDTH//2 - 180, stats_y))
 
         # Player name
-        self.draw_text_with_emoji(f"👤 Player: {self.player_name}", self.font_medium, CYAN,
+        self.draw_text_with_emoji(f"👤 Player: {self.sim.player_name}", self.font_medium, CYAN,
                                 (SCREEN_WIDTH//2 - 140, stats_y + 60))
 
         # Problems solved
-        self.draw_text_with_emoji(f"🧮 Problems Solved: {self.problems_solved}", self.font_medium, WHITE,
+        self.draw_text_with_emoji(f"🧮 Problems Solved: {self.sim.problems_solved}", self.font_medium, WHITE,
                                 (SCREEN_WIDTH//2 - 180, stats_y + 120))
 
         # Accuracy percentage
@@ -623,159 +584,209 @@ class MathBallGame:
         self.draw_text_with_emoji("🔄 Press SPACE to play again or ESC to quit", self.font_medium, WHITE,
                                 (SCREEN_WIDTH//2 - 300, stats_y + 300))
 
-    def spawn_ball(self):
-        if len(self.balls) < 8:
-            x = random.randint(80, SCREEN_WIDTH - 80)
-            y = random.randint(-120, -60)
-            self.balls.append(MathBall(x, y))
-            
-    def update_game(self):
-        current_time = time.time()
-        self.time_left = 30 - (current_time - self.start_time)
-
-        if self.time_left <= 0:
-            self.state = "game_over"
-            self.play_sound("game_over")
-            self.create_particle_explosion(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, YELLOW, 40)
-            return
-
-        # Update balls and check if selected ball is out of bounds
-        for ball in self.balls[:]:
-            ball.update()
-            if ball.is_out_of_bounds():
-                # If the selected ball goes out of bounds, close the popup
-                if self.selected_ball == ball:
-                    self.selected_ball = None
-                    self.input_text = ""
-                self.balls.remove(ball)
-
-        # Spawn balls randomly (like raindrops)
-        spawn_probability = 0.025 if len(self.balls) < 4 else 0.015
-        if random.random() < spawn_probability:
-            self.spawn_ball()
-
-    def handle_ball_click(self, pos):
-        for ball in self.balls:
-            if ball.is_clicked(pos):
-                self.selected_ball = ball
-                self.input_text = ""
+        # Leaderboard, once the query comes back
+        if self.top_players is not None and not (self.top_players.done() and self.top_players.exception()):
+            rows = tuple(self.top_players.result()) if self.top_players.done() else None
+            self.dirty.mark(self.hud.draw(self.screen, "leaderboard", rows))
+
+    def handle_sim_events(self):
+        """Play sounds and effects for what happened in the simulation"""
+        for event in self.sim.pop_events():
+            kind = event[0]
+            if kind == EVENT_ROUND_STARTED:
+                self.particles.clear()
+                self.start_background_music()
+            elif kind == EVENT_BALL_SELECTED:
+                ball = event[1]
                 self.create_particle_explosion(ball.x, ball.y, ball.color, 12)
-                break
-
-    def check_answer(self):
-        try:
-            # Handle both integer and decimal answers
-            if '.' in str(self.selected_ball.answer):
-                user_answer = float(self.input_text)
-                correct = abs(user_answer - self.selected_ball.answer) < 0.01
-            else:
-                user_answer = int(self.input_text)
-                correct = user_answer == self.selected_ball.answer
-
-            self.problems_solved += 1
-
-            if correct:
-                self.score += 5
-                self.correct_answers += 1
-                self.last_answer_correct = True
-                self.play_sound("correct")
-                self.create_particle_explosion(self.selected_ball.x, self.selected_ball.y, GREEN, 25)
-            else:
-                self.score -= 2
-                self.last_answer_correct = False
-                self.play_sound("wrong")
-                self.create_particle_explosion(self.selected_ball.x, self.selected_ball.y, RED, 20)
-
-            # Set feedback timer
-            self.answer_feedback_timer = 150
-
-            self.balls.remove(self.selected_ball)
-            self.selected_ball = None
-            self.input_text = ""
-        except ValueError:
-            pass
+            elif kind == EVENT_ANSWERED:
+                correct, x, y = event[1:]
+                if correct:
+                    self.play_sound("correct")
+                    self.create_particle_explosion(x, y, GREEN, 25)
+                else:
+                    self.play_sound("wrong")
+                    self.create_particle_explosion(x, y, RED, 20)
+            elif kind == EVENT_ROUND_OVER:
+                self.play_sound("game_over")
+                if self.leaderboard:
+                    sim = self.sim
+                    # A replayed round was saved when it was played
+                    if not self.replay:
+                        self.leaderboard.record(sim.player_name, sim.score, sim.problems_solved,
+                                                sim.correct_answers)
+                    self.top_players = self.leaderboard.top_players(LEADERBOARD_ROWS)
+                self.create_particle_explosion(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, YELLOW, 40)
+            elif kind == EVENT_RESTARTED:
+                if pygame.mixer.get_init():
+                    pygame.mixer.music.stop()
+            elif kind == EVENT_QUIT:
+                self.running = False
+
+    def draw_profiler_overlay(self):
+        """Frame phase percentiles in milliseconds, refreshed twice a second"""
+        if self.profiler_surface is None or self.profiler.frames % PROFILER_REFRESH == 0:
+            columns = ("p50", "p95", "p99", "worst")
+            rows = ("work",) + PHASES + ("jitter",)
+            counters = (
+                f"hud rebuilds {self.hud.rebuilds}",
+                f"cache hits: sprites {hit_rate(ball_sprites)}, text {hit_rate(self.text_cache)}",
+                "presented the full frame" if self.dirty.rects_presented is None
+                else f"presented {self.dirty.rects_presented} dirty rects"
+            )
+            line_height = 20
+            surface = pygame.Surface((345, line_height * (len(rows) + len(counters) + 1) + 10), pygame.SRCALPHA)
+            surface.fill((0, 0, 0, 190))
+
+            surface.blit(self.font_small.render(self.quality.level.name, True, CYAN), (8, 5))
+            for col, name in enumerate(columns):
+                surface.blit(self.font_small.render(name, True, YELLOW), (112 + col * 58, 5))
+            for row, phase in enumerate(rows, start=1):
+                y = 5 + row * line_height
+                surface.blit(self.font_small.render(phase, True, WHITE), (8, y))
+                if phase == "jitter":
+                    stats = self.scheduler.summary()
+                else:
+                    stats = self.profiler.summary(phase)
+                if stats is None:
+                    continue
+                for col, name in enumerate(columns):
+                    value = self.font_small.render(f"{stats[name]:.2f}", True, WHITE)
+                    surface.blit(value, (112 + col * 58, y))
+            for row, counter in enumerate(counters, start=len(rows) + 1):
+                surface.blit(self.font_small.render(counter, True, CYAN), (8, 5 + row * line_height))
+            self.profiler_surface = surface
+
+        self.blit(self.profiler_surface, (SCREEN_WIDTH - self.profiler_surface.get_width() - 15,
+                                          SCREEN_HEIGHT - self.profiler_surface.get_height() - 15))
+
+    def update_fixed(self):
+        """Advance everything that moves by one fixed simulation step"""
+        if self.replay:
+            self.replay.feed()
+            if self.replay.finished:
+                # Hold on the recording's last tick
+                return
+        self.sim.tick()
+        self.update_particles()
+        self.starfield.update()
+        if self.sim.state == "menu":
+            self.menu_animation += 0.02
 
     async def run(self):
-        running = True
-
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-
-                elif event.type == pygame.KEYDOWN:
-                    if self.state == "menu":
-                        if event.key == pygame.K_SPACE:
-                            self.state = "name_input"
-
-                    elif self.state == "name_input":
-                        if event.key == pygame.K_RETURN and self.player_name.strip():
-                            self.state = "game"
-                            self.start_time = time.time()
-                            self.score = 0
-                            self.balls = []
-                            self.particles = []
-                            self.last_answer_correct = None
-                            self.answer_feedback_timer = 0
-                            self.problems_solved = 0
-                            self.correct_answers = 0
-                            self.start_background_music()
-                        elif event.key == pygame.K_BACKSPACE:
-                            self.player_name = self.player_name[:-1]
-                        else:
-                            if len(self.player_name) < 25 and event.unicode.isprintable():
-                                self.player_name += event.unicode
-
-                    elif self.state == "game":
-                        if self.selected_ball:
-                            if event.key == pygame.K_RETURN:
-                                self.check_answer()
-                            elif event.key == pygame.K_BACKSPACE:
-                                self.input_text = self.input_text[:-1]
-                            elif event.unicode.isdigit() or event.unicode in '.-':
-                                if len(self.input_text) < 10:
-                                    # Allow negative numbers and decimals
-                                    if event.unicode == '-' and self.input_text:
-                                        pass  # Don't allow minus in middle
-                                    elif event.unicode == '.' and '.' in self.input_text:
-                                        pass  # Don't allow multiple decimals
-                                    else:
-                                        self.input_text += event.unicode
-
-                    elif self.state == "game_over":
-                        if event.key == pygame.K_SPACE:
-                            self.state = "name_input"
-                            self.player_name = ""
-                            pygame.mixer.music.stop()
-                        elif event.key == pygame.K_ESCAPE:
-                            running = False
-
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if self.state == "game" and not self.selected_ball:
-                        self.handle_ball_click(event.pos)
-
-            # Update game state
-            if self.state == "game":
-                self.update_game()
-
-            # Draw everything
-            if self.state == "menu":
-                self.draw_menu()
-            elif self.state == "name_input":
-                self.draw_name_input()
-            elif self.state == "game":
-                self.draw_game()
-            elif self.state == "game_over":
-                self.draw_game_over()
-
-            pygame.display.flip()
-            await asyncio.sleep(0)
-            self.clock.tick(60)
-
-        pygame.quit()
-
-async def main():
-    game = MathBallGame()
+        self.running = True
+        self.asset_task = asyncio.ensure_future(self.load_assets())
+        accumulator = 0.0
+        previous = time.perf_counter()
+
+        # Whatever ends the loop, keep the recording and the queued rounds
+        try:
+            while self.running:
+                self.profiler.begin_frame()
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.running = False
+
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_F2:
+                        self.set_dirty_rects(not self.dirty_rects)
+
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                        self.show_profiler = not self.show_profiler
+
+                    elif self.replay:
+                        # Inputs come from the recording
+                        continue
+
+                    elif event.type == pygame.KEYDOWN:
+                        self.controls.key_down(KEY_MAP.get(event.key, KEY_OTHER), event.unicode)
+
+                    elif event.type == pygame.MOUSEBUTTONDOWN:
+                        self.controls.mouse_down(event.pos)
+                if self.controls is not self.sim:
+                    self.controls.flush()
+                self.profiler.lap("events")
+
+                # Update game state in fixed steps, however long the frame took
+                now = time.perf_counter()
+                accumulator += min(now - previous, MAX_FRAME_TIME)
+                previous = now
+                while accumulator >= TICK_SECONDS:
+                    self.update_fixed()
+                    accumulator -= TICK_SECONDS
+                self.alpha = accumulator / TICK_SECONDS
+                self.handle_sim_events()
+                self.profiler.lap("update")
+
+                # Draw everything
+                if self.sim.state == "menu":
+                    self.draw_menu()
+                elif self.sim.state == "name_input":
+                    self.draw_name_input()
+                elif self.sim.state == "game":
+                    self.draw_game()
+                elif self.sim.state == "game_over":
+                    self.draw_game_over()
+                if self.sim.state != "game":
+                    # draw_game laps its own phases
+                    self.profiler.lap("screens")
+
+                if self.show_profiler:
+                    self.draw_profiler_overlay()
+                    self.profiler.lap("overlay")
+
+                self.present()
+                self.profiler.lap("present")
+                # Background tasks run while this waits for the next frame
+                await self.scheduler.wait()
+                self.profiler.lap("wait")
+                level = self.quality.record(self.profiler.end_frame())
+                if level is not None:
+                    self.apply_quality(level)
+
+        finally:
+            if self.profile_dump:
+                self.profiler.dump(self.profile_dump)
+            if self.controls is not self.sim:
+                self.controls.close()
+            if self.leaderboard:
+                self.leaderboard.close()
+            pygame.quit()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Math Ball Catcher")
+    parser.add_argument("--fps", type=int, default=TICK_RATE,
+                        help="render frame cap, e.g. 30, 60 or 144; 0 for uncapped")
+    parser.add_argument("--stars", type=int, default=STAR_COUNT, help="number of background stars")
+    parser.add_argument("--dirty-rects", action="store_true", help="start in dirty-rectangle mode")
+    parser.add_argument("--seed", type=int, help="seed for the game's random numbers")
+    parser.add_argument("--tier", action="append", choices=TIER_NAMES, dest="tiers",
+                        help="only ask problems of this difficulty; repeat to allow several")
+    parser.add_argument("--max-balls", type=int, default=MAX_BALLS, help="most balls on screen at once")
+    parser.add_argument("--storm", action="store_const", const=STORM_BALLS, dest="max_balls",
+                        help=f"storm mode: up to {STORM_BALLS} balls")
+    parser.add_argument("--quality", choices=QUALITY_NAMES,
+                        help="pin the render quality instead of adapting it to frame times")
+    parser.add_argument("--verbose", action="store_true", help="log asset load times and other details")
+    parser.add_argument("--profile-dump", metavar="PATH",
+                        help="save frame timings at exit (.csv, or .json)")
+    sessions = parser.add_mutually_exclusive_group()
+    sessions.add_argument("--record", metavar="PATH", help="record this session's inputs for replay")
+    sessions.add_argument("--replay", metavar="PATH",
+                          help="play back a recorded session; replay.py checks one headless")
+    parser.add_argument("--leaderboard", metavar="PATH",
+                        help="leaderboard database (default: in the per-user data directory)")
+    # The web build may pass arguments of its own
+    return parser.parse_known_args(argv)[0]
+
+async def main(args=None):
+    if args is None:
+        args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    game = MathBallGame(star_count=args.stars, dirty_rects=args.dirty_rects,
+                        seed=args.seed, fps=args.fps, profile_dump=args.profile_dump,
+                        tiers=args.tiers and [TIER_NAMES.index(tier) for tier in args.tiers],
+                        max_balls=args.max_balls, quality=args.quality, record=args.record,
+                        replay=args.replay and Replay.load(args.replay), leaderboard=args.leaderboard)
     await game.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+import random
+from array import array
+
+import pygame
+
+from assets import display_format
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GRAVITY = 0.1
+PARTICLE_LIFE = 30
+MAX_PARTICLE_SIZE = 5
+DEFAULT_CAPACITY = 16384
+
+
+class ParticleSystem:
+    """Fixed-capacity particle pool stored as parallel arrays.
+
+    Live particles are packed into slots [0, count). A particle that dies is
+    replaced by the last live one, so freeing a slot never shifts the rest.
+    NumPy is used for the update step when it is installed.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, rng=random):
+        self.capacity = capacity
+        self.count = 0
+        self.rng = rng
+
+        if np is not None:
+            def floats():
+                return np.zeros(capacity, np.float32)
+
+            def ints():
+                return np.zeros(capacity, np.int32)
+        else:
+            def floats():
+                return array('f', bytes(4 * capacity))
+
+            def ints():
+                return array('i', bytes(4 * capacity))
+
+        self.x = floats()
+        self.y = floats()
+        self.vx = floats()
+        self.vy = floats()
+        self.life = ints()
+        self.size = ints()
+        # Index into self.sprites, one sprite per (color, size)
+        self.kind = ints()
+        self.columns = (self.x, self.y, self.vx, self.vy, self.life, self.size, self.kind)
+
+        self.palette = {}
+        self.sprites = []
+
+    def __len__(self):
+        return self.count
+
+    def kind_for(self, color, size):
+        if color not in self.palette:
+            self.palette[color] = len(self.palette)
+            for dot_size in range(MAX_PARTICLE_SIZE + 1):
+                sprite = pygame.Surface((dot_size * 2, dot_size * 2), pygame.SRCALPHA)
+                pygame.draw.circle(sprite, color, (dot_size, dot_size), dot_size)
+                self.sprites.append(display_format(sprite, alpha=True))
+        return self.palette[color] * (MAX_PARTICLE_SIZE + 1) + size
+
+    def emit(self, x, y, color, count=15):
+        """Spawn an explosion; particles beyond capacity are dropped"""
+        uniform = self.rng.uniform
+        randint = self.rng.randint
+        for i in range(self.count, min(self.count + count, self.capacity)):
+            size = randint(2, MAX_PARTICLE_SIZE)
+            self.x[i] = x
+            self.y[i] = y
+            self.vx[i] = uniform(-3, 3)
+            self.vy[i] = uniform(-5, -1)
+            self.life[i] = PARTICLE_LIFE
+            self.size[i] = size
+            self.kind[i] = self.kind_for(color, size)
+            self.count = i + 1
+
+    def update(self):
+        if np is not None:
+            self.update_vectorized()
+        else:
+            self.update_python()
+
+    def update_vectorized(self):
+        n = self.count
+        if not n:
+            return
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vy[:n] += GRAVITY
+        life = self.life[:n]
+        life -= 1
+
+        dead = np.flatnonzero(life <= 0)
+        if not dead.size:
+            return
+        # Fill holes below the new count with survivors from above it
+        alive = n - dead.size
+        holes = dead[dead < alive]
+        movers = np.flatnonzero(life[alive:] > 0) + alive
+        for column in self.columns:
+            column[holes] = column[movers]
+        self.count = alive
+
+    def update_python(self):
+        x, y, vx, vy, life = self.x, self.y, self.vx, self.vy, self.life
+        n = self.count
+        i = 0
+        while i < n:
+            x[i] += vx[i]
+            y[i] += vy[i]
+            vy[i] += GRAVITY
+            life[i] -= 1
+            if life[i] > 0:
+                i += 1
+                continue
+            # Swap-remove; the moved particle is updated on the next pass
+            n -= 1
+            for column in self.columns:
+                column[i] = column[n]
+        self.count = n
+
+    def draw(self, screen):
+        """Blit every live particle; returns the bounding rect drawn"""
+        n = self.count
+        if not n:
+            return None
+        size = self.size[:n]
+        if np is not None:
+            left = self.x[:n].astype(np.int32) - size
+            top = self.y[:n].astype(np.int32) - size
+            bounds = pygame.Rect(int(left.min()), int(top.min()), 0, 0)
+            bounds.width = int((left + 2 * size).max()) - bounds.x
+            bounds.height = int((top + 2 * size).max()) - bounds.y
+            xs, ys = left.tolist(), top.tolist()
+            kinds = self.kind[:n].tolist()
+        else:
+            xs = [int(px) - s for px, s in zip(self.x[:n], size)]
+            ys = [int(py) - s for py, s in zip(self.y[:n], size)]
+            bounds = pygame.Rect(min(xs), min(ys), 0, 0)
+            bounds.width = max(px + 2 * s for px, s in zip(xs, size)) - bounds.x
+            bounds.height = max(py + 2 * s for py, s in zip(ys, size)) - bounds.y
+            kinds = self.kind[:n]
+        sprites = self.sprites
+        screen.blits([(sprites[k], (px, py)) for k, px, py in zip(kinds, xs, ys)], False)
+        return bounds.clip(screen.get_rect())
+
+    def clear(self):
+        self.count = 0
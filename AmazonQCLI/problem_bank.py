@@ -0,0 +1,343 @@
+"""Every problem the game can ask, precomputed and indexed.
+
+The operand ranges of each problem kind are small, so the whole space
+(about 28,000 problems) is enumerated once into parallel arrays. Each
+problem gets a difficulty score and a tier, and the arrays are sorted so
+the problems of each (kind, tier) pair form one contiguous bucket. A
+ProblemDeck draws from those buckets in O(1) without repeating a problem
+until its bucket runs out.
+
+The bank can be saved to a compact file and loaded instead of rebuilt.
+The file records the GENERATOR_VERSION it was built with; bump it after
+changing how problems are generated or scored, and the game rebuilds the
+bank until it is saved again:
+
+    python problem_bank.py            # writes problems.bank next to this file
+"""
+import argparse
+import logging
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+BANK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "problems.bank")
+MAGIC = b"MBPB"
+VERSION = 2
+# Bump when enumerate_problems, difficulty or the tables they use change
+GENERATOR_VERSION = 1
+# magic, version, problem count, generator version
+HEADER = struct.Struct("<4sHII")
+
+# Problem kinds
+ADD = 0
+SUB = 1
+MUL = 2
+DIV = 3
+SQUARE = 4
+POWER = 5
+FRACTION = 6
+MIXED_ADD_MUL = 7
+MIXED_SUB_DIV = 8
+MIXED_PARENTHESES = 9
+KINDS = range(10)
+KIND_NAMES = (
+    "add", "sub", "mul", "div", "square", "power", "fraction",
+    "mixed_add_mul", "mixed_sub_div", "mixed_parentheses"
+)
+
+QUESTION_FORMATS = (
+    "{a} + {b}", "{a} - {b}", "{a} x {b}", "{a} / {b}", "{a}²", "{a}^{b}", "{a}/{b} as %",
+    "{a} + {b} x {c}", "{a} - {b} / {c}", "({a} + {b}) x {c}"
+)
+# Chance of each kind: seven plain kinds and 'mixed' equally likely, with
+# 'mixed' split evenly over its three forms
+KIND_WEIGHTS = (3, 3, 3, 3, 3, 3, 3, 1, 1, 1)
+# A deck leaves out kinds with fewer problems than this in its tiers, so a
+# session doesn't keep asking the same few; every kind has at least this
+# many over all tiers
+MIN_KIND_PROBLEMS = 8
+# Starting difficulty of each kind before carries, digits and signs
+KIND_BASE = (0, 1, 3, 3, 1, 2, 2, 3, 3, 4)
+
+TIER_NAMES = ("easy", "medium", "hard")
+TIERS = len(TIER_NAMES)
+
+logger = logging.getLogger("mathball.problems")
+
+
+def enumerate_problems():
+    """(kind, a, b, c, answer) for every problem generate_problem could make"""
+    for a in range(45, 151):
+        for b in range(35, 121):
+            yield ADD, a, b, 0, a + b
+    for a in range(80, 201):
+        for b in range(30, a + 21):
+            yield SUB, a, b, 0, a - b
+    for a in range(12, 26):
+        for b in range(11, 21):
+            yield MUL, a, b, 0, a * b
+    for b in range(8, 16):
+        for answer in range(12, 26):
+            yield DIV, b * answer, b, 0, answer
+    for a in range(8, 16):
+        yield SQUARE, a, 0, 0, a * a
+    for a in range(3, 9):
+        for b in range(2, 4):
+            yield POWER, a, b, 0, a ** b
+    for b in (2, 4, 5, 8, 10):
+        for a in range(1, b * 3 + 1):
+            yield FRACTION, a, b, 0, int((a / b) * 100)
+    for a in range(10, 31):
+        for b in range(5, 13):
+            for c in range(3, 9):
+                yield MIXED_ADD_MUL, a, b, c, a + b * c
+    for c in range(2, 7):
+        for k in range(4, 11):
+            for a in range(20, 51):
+                yield MIXED_SUB_DIV, a, c * k, c, a - k
+    for a in range(8, 21):
+        for b in range(5, 16):
+            for c in range(3, 8):
+                yield MIXED_PARENTHESES, a, b, c, (a + b) * c
+
+
+def carries(a, b):
+    """Column carries when adding two non-negative numbers"""
+    count = carry = 0
+    while a or b:
+        carry = 1 if a % 10 + b % 10 + carry >= 10 else 0
+        count += carry
+        a //= 10
+        b //= 10
+    return count
+
+
+def borrows(a, b):
+    """Column borrows when taking the smaller number from the larger"""
+    a, b = max(a, b), min(a, b)
+    count = borrow = 0
+    while b or borrow:
+        borrow = 1 if a % 10 - b % 10 - borrow < 0 else 0
+        count += borrow
+        a //= 10
+        b //= 10
+    return count
+
+
+def difficulty(kind, a, b, c, answer):
+    """Rough effort to solve: a per-kind base plus carries, digits and signs"""
+    score = KIND_BASE[kind] + len(str(abs(answer)))
+    if kind == ADD:
+        score += carries(a, b)
+    elif kind == SUB:
+        score += borrows(a, b) + (2 if answer < 0 else 0)
+    elif kind in (MUL, DIV):
+        # Two-digit factors with no zeros need the longest working
+        score += sum(1 for digit in str(b) if digit != "0")
+    elif kind == POWER:
+        score += b - 2
+    elif kind == FRACTION:
+        score += (a > b) + (b == 8)
+    elif kind == MIXED_ADD_MUL:
+        score += carries(a, b * c)
+    elif kind == MIXED_SUB_DIV:
+        score += borrows(a, b // c) + (2 if answer < 0 else 0)
+    elif kind == MIXED_PARENTHESES:
+        score += carries(a, b)
+    return score
+
+
+class ProblemBank:
+    """Parallel arrays of problems, sorted by kind and then tier.
+
+    buckets maps each (kind, tier) present to the range of its indices.
+    """
+
+    def __init__(self, kinds, a, b, c, answers, scores, tiers):
+        self.kinds = kinds
+        self.a = a
+        self.b = b
+        self.c = c
+        self.answers = answers
+        self.scores = scores
+        self.tiers = tiers
+        self.buckets = {}
+        for kind in KINDS:
+            kind_start = bisect_left(kinds, kind)
+            kind_stop = bisect_left(kinds, kind + 1)
+            for tier in range(TIERS):
+                start = bisect_left(tiers, tier, kind_start, kind_stop)
+                stop = bisect_left(tiers, tier + 1, kind_start, kind_stop)
+                if start < stop:
+                    self.buckets[kind, tier] = range(start, stop)
+
+    @classmethod
+    def build(cls):
+        problems = [problem + (difficulty(*problem),) for problem in enumerate_problems()]
+
+        # Tiers split the scores into thirds
+        ranked = sorted(problem[5] for problem in problems)
+        thresholds = [ranked[len(ranked) * tier // TIERS] for tier in range(1, TIERS)]
+        problems = [problem + (sum(problem[5] >= threshold for threshold in thresholds),)
+                    for problem in problems]
+        problems.sort(key=lambda problem: (problem[0], problem[6]))
+
+        kinds, a, b, c, answers, scores, tiers = zip(*problems)
+        return cls(array('B', kinds), array('h', a), array('h', b), array('h', c),
+                   array('i', answers), array('B', scores), array('B', tiers))
+
+    def columns(self):
+        return (self.kinds, self.a, self.b, self.c, self.answers, self.scores, self.tiers)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def question(self, index):
+        return QUESTION_FORMATS[self.kinds[index]].format(
+            a=self.a[index], b=self.b[index], c=self.c[index])
+
+    def save(self, path=BANK_PATH):
+        """Write the columns little-endian and zlib-compressed"""
+        payload = bytearray()
+        for column in self.columns():
+            if sys.byteorder != "little":
+                column = array(column.typecode, column)
+                column.byteswap()
+            payload += column.tobytes()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self), GENERATOR_VERSION))
+            f.write(zlib.compress(bytes(payload), 9))
+
+    @classmethod
+    def load(cls, path=BANK_PATH, expected=None):
+        """Read a saved bank; with `expected`, reject one from another generator version"""
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            payload = f.read()
+        if len(header) != HEADER.size:
+            raise ValueError(f"{path} is not a problem bank")
+        magic, version, count, generators = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} problem bank")
+        if expected is not None and generators != expected:
+            raise ValueError(f"{path} is stale; run python problem_bank.py to rebuild it")
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as e:
+            raise ValueError(f"{path} is corrupt: {e}")
+
+        columns = []
+        offset = 0
+        for typecode in "BhhhiBB":
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(payload[offset:offset + size])
+            if sys.byteorder != "little":
+                column.byteswap()
+            offset += size
+            columns.append(column)
+        if offset != len(payload):
+            raise ValueError(f"{path} is corrupt: expected {offset} bytes, found {len(payload)}")
+        return cls(*columns)
+
+
+_default_bank = None
+
+
+def default_bank():
+    """The shared bank, loaded from BANK_PATH if it is there, else built"""
+    global _default_bank
+    if _default_bank is None:
+        start = time.perf_counter()
+        source = "built"
+        if os.path.exists(BANK_PATH):
+            try:
+                _default_bank = ProblemBank.load(BANK_PATH, GENERATOR_VERSION)
+                source = "loaded"
+            except (OSError, ValueError) as e:
+                logger.warning("rebuilding problem bank: %s", e)
+        if _default_bank is None:
+            _default_bank = ProblemBank.build()
+        logger.info("problem bank %s in %.1f ms (%d problems)", source,
+                    (time.perf_counter() - start) * 1000, len(_default_bank))
+    return _default_bank
+
+
+class ProblemDeck:
+    """One session's draws from a bank, without repeats.
+
+    Each draw picks a bucket by kind weight, then a problem from it with one
+    step of a sparse Fisher-Yates shuffle: only the swapped positions are
+    stored, so starting or resetting a bucket costs nothing. A bucket is
+    reshuffled once every problem in it has been drawn.
+    """
+
+    def __init__(self, bank, rng=random, tiers=None):
+        self.bank = bank
+        self.rng = rng
+        self.set_tiers(tiers)
+
+    def set_tiers(self, tiers=None):
+        """Limit draws to the given tier numbers; None allows all of them"""
+        self.tiers = tuple(range(TIERS)) if tiers is None else tuple(tiers)
+        buckets = self.bank.buckets
+        self.keys = []
+        weights = []
+        for kind in KINDS:
+            keys = [(kind, tier) for tier in self.tiers if (kind, tier) in buckets]
+            if sum(len(buckets[key]) for key in keys) < MIN_KIND_PROBLEMS:
+                continue
+            total = sum(len(buckets[kind, tier]) for tier in range(TIERS) if (kind, tier) in buckets)
+            # A kind's weight shrinks with the share of its problems allowed,
+            # and within a kind every allowed problem stays equally likely
+            for key in keys:
+                self.keys.append(key)
+                weights.append(KIND_WEIGHTS[kind] * len(buckets[key]) / total)
+        if not self.keys:
+            raise ValueError(f"no problems in tiers {self.tiers}")
+        self.cum_weights = list(accumulate(weights))
+        self.swaps = {key: {} for key in self.keys}
+        self.remaining = {key: len(buckets[key]) for key in self.keys}
+
+    def draw(self):
+        """Index of the next problem in the bank"""
+        key = self.rng.choices(self.keys, cum_weights=self.cum_weights)[0]
+        bucket = self.bank.buckets[key]
+        swaps = self.swaps[key]
+        remaining = self.remaining[key]
+        if remaining == 0:
+            swaps.clear()
+            remaining = len(bucket)
+
+        position = self.rng.randrange(remaining)
+        last = remaining - 1
+        picked = swaps.get(position, position)
+        if position != last:
+            swaps[position] = swaps.get(last, last)
+        swaps.pop(last, None)
+        self.remaining[key] = last
+        return bucket[picked]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Math Ball Catcher problem bank")
+    parser.add_argument("--output", default=BANK_PATH, help="where to write the bank")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    bank = ProblemBank.build()
+    bank.save(args.output)
+    print(f"{len(bank)} problems in {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{os.path.getsize(args.output)} bytes written to {args.output}")
+    for tier, name in enumerate(TIER_NAMES):
+        print(f"{name:<8}{bank.tiers.count(tier):>8}")
+
+
+if __name__ == "__main__":
+    main()
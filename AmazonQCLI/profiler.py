@@ -0,0 +1,95 @@
+import csv
+import json
+import time
+from array import array
+
+# Frame phases in the order run() goes through them; "screens" is whatever
+# the menu, name input and game over screens draw over their background
+PHASES = ("events", "update", "background", "particles", "balls", "hud", "popup",
+          "screens", "overlay", "present", "wait")
+# Everything except waiting for the next frame counts against the frame budget
+WORK_PHASES = PHASES[:-1]
+DEFAULT_CAPACITY = 600
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(samples):
+    """Percentiles and worst case of some samples, or None if there are none"""
+    values = sorted(samples)
+    if not values:
+        return None
+    stats = {f"p{p}": values[min(len(values) - 1, len(values) * p // 100)] for p in PERCENTILES}
+    stats["worst"] = values[-1]
+    return stats
+
+
+class FrameProfiler:
+    """Per-phase frame timings kept in fixed-size ring buffers.
+
+    Phases are timed as laps: each lap(phase) charges the time since the
+    previous lap to that phase, so instrumenting the frame loop costs one
+    perf_counter call per boundary.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, clock=time.perf_counter):
+        self.capacity = capacity
+        self.clock = clock
+        self.samples = {phase: array('d', bytes(8 * capacity)) for phase in PHASES + ("work",)}
+        self.frames = 0
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.last = clock()
+
+    def begin_frame(self):
+        for phase in self.current:
+            self.current[phase] = 0.0
+        self.last = self.clock()
+
+    def lap(self, phase):
+        now = self.clock()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        """Store the frame's timings; returns its work time in milliseconds"""
+        index = self.frames % self.capacity
+        for phase, seconds in self.current.items():
+            self.samples[phase][index] = seconds * 1000
+        work = sum(self.current[phase] for phase in WORK_PHASES) * 1000
+        self.samples["work"][index] = work
+        self.frames += 1
+        return work
+
+    def history(self, phase):
+        """Samples for a phase in milliseconds, oldest first"""
+        ring = self.samples[phase]
+        if self.frames <= self.capacity:
+            return list(ring[:self.frames])
+        start = self.frames % self.capacity
+        return list(ring[start:]) + list(ring[:start])
+
+    def summary(self, phase):
+        return summarize(self.history(phase))
+
+    def report(self):
+        return {phase: self.summary(phase) for phase in ("work",) + PHASES}
+
+    def dump(self, path):
+        """Write the buffered samples to CSV, or JSON if the path ends in .json"""
+        columns = ("work",) + PHASES
+        histories = [self.history(phase) for phase in columns]
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({
+                    "unit": "ms",
+                    "frames": self.frames,
+                    "summary": self.report(),
+                    "samples": dict(zip(columns, histories))
+                }, f, indent=1)
+            return
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("frame",) + columns)
+            first = self.frames - len(histories[0])
+            for row, values in enumerate(zip(*histories)):
+                writer.writerow([first + row] + [f"{value:.4f}" for value in values])
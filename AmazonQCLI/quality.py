@@ -0,0 +1,84 @@
+import logging
+from collections import deque, namedtuple
+
+from profiler import summarize
+
+# ring_step: pixels between a ball sprite's gradient rings
+# stars, particles: fraction of stars drawn and of particles emitted
+# animate_background: whether the background gradient sways
+QualityLevel = namedtuple("QualityLevel", "name ring_step stars particles animate_background")
+
+QUALITY_LEVELS = (
+    QualityLevel("low", 4, 0.25, 0.3, False),
+    QualityLevel("medium", 2, 0.5, 0.6, True),
+    QualityLevel("high", 1, 1.0, 1.0, True),
+)
+QUALITY_NAMES = tuple(level.name for level in QUALITY_LEVELS)
+
+# Frames in the rolling window, and frames between looks at it
+WINDOW = 60
+CHECK_EVERY = 15
+# Drop a level when the window's p95 work time exceeds this share of the
+# frame budget; raise one only after RAISE_CHECKS looks in a row below the
+# lower share. The gap keeps the level from flapping.
+DROP_SHARE = 0.9
+RAISE_SHARE = 0.5
+RAISE_CHECKS = 12
+
+logger = logging.getLogger("mathball.quality")
+
+
+class QualityGovernor:
+    """Steps the render quality down when frames run over budget, and back up.
+
+    record() takes each frame's work time. Every CHECK_EVERY frames the p95
+    of the last WINDOW frames is compared with the frame budget: over
+    DROP_SHARE of it drops a level at once, while raising a level waits for
+    RAISE_CHECKS calm looks in a row. After a change the window refills at
+    the new level before the next decision. A pinned governor never changes
+    level.
+    """
+
+    def __init__(self, fps, pinned=None, window=WINDOW):
+        # With no frame cap, hold the 60 Hz budget
+        self.budget_ms = 1000 / (fps if fps > 0 else 60)
+        self.samples = deque(maxlen=window)
+        self.window = window
+        self.pinned = pinned
+        self.index = QUALITY_NAMES.index(pinned) if pinned else len(QUALITY_LEVELS) - 1
+        self.frames = 0
+        self.calm_checks = 0
+        self.changes = 0
+
+    @property
+    def level(self):
+        return QUALITY_LEVELS[self.index]
+
+    def record(self, work_ms):
+        """Add a frame's work time; returns the new level if it changed"""
+        self.samples.append(work_ms)
+        self.frames += 1
+        if self.pinned or len(self.samples) < self.window or self.frames % CHECK_EVERY:
+            return None
+        p95 = summarize(self.samples)["p95"]
+
+        if p95 > self.budget_ms * DROP_SHARE:
+            self.calm_checks = 0
+            if self.index > 0:
+                return self.change(self.index - 1, p95)
+        elif p95 < self.budget_ms * RAISE_SHARE:
+            self.calm_checks += 1
+            if self.calm_checks >= RAISE_CHECKS and self.index < len(QUALITY_LEVELS) - 1:
+                return self.change(self.index + 1, p95)
+        else:
+            self.calm_checks = 0
+        return None
+
+    def change(self, index, p95):
+        logger.info("quality %s -> %s (p95 work %.1f ms of %.1f ms)",
+                    self.level.name, QUALITY_LEVELS[index].name, p95, self.budget_ms)
+        self.index = index
+        self.changes += 1
+        self.calm_checks = 0
+        self.samples.clear()
+        return self.level
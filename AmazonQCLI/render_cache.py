@@ -0,0 +1,194 @@
+from collections import OrderedDict
+
+import pygame
+
+from assets import display_format
+
+
+def hit_rate(cache):
+    """A cache's share of lookups served without rendering, as text"""
+    lookups = cache.hits + cache.misses
+    return f"{cache.hits / lookups:.1%}" if lookups else "-"
+
+
+class BallSpriteCache:
+    """Pre-rendered ball sprites keyed by color and drawn radius"""
+
+    # MathBall pulses between radius - 5 and radius + 5 in whole pixels, so
+    # there are at most 11 distinct frames per ball. Balls whose pulsed
+    # radii coincide share frames.
+    GLOW_WIDTH = 3
+    GLOW_OFFSET = 5
+    # Sprites re-rendered per frame after a ring step change; the rest keep
+    # drawing at the old step until their turn
+    UPGRADES_PER_FRAME = 4
+
+    # Enough for every color at every drawn radius (8 colors x radii 45-85,
+    # about 28 MB), so even storm mode never re-renders a sprite
+    def __init__(self, max_sprites=384):
+        self.max_sprites = max_sprites
+        # Pixels between gradient rings; higher is cheaper to render
+        self.ring_step = 1
+        self.sprites = OrderedDict()
+        # (color, drawn radius) -> ring step it was last rendered at
+        self.latest = {}
+        self.upgrades_left = self.UPGRADES_PER_FRAME
+        self.hits = 0
+        self.misses = 0
+
+    def begin_frame(self):
+        self.upgrades_left = self.UPGRADES_PER_FRAME
+
+    def get(self, color, radius, pulse_offset):
+        drawn = radius + pulse_offset
+        key = (color, drawn, self.ring_step)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        # Rendered at another ring step: reuse it unless this frame still
+        # has upgrades to spend
+        old_key = (color, drawn, self.latest.get((color, drawn)))
+        old = self.sprites.get(old_key)
+        if old is not None:
+            if self.upgrades_left <= 0:
+                self.sprites.move_to_end(old_key)
+                self.hits += 1
+                return old
+            self.upgrades_left -= 1
+            del self.sprites[old_key]
+
+        self.misses += 1
+        sprite = self.render(color, drawn)
+        self.sprites[key] = sprite
+        self.latest[(color, drawn)] = self.ring_step
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def render(self, color, current_radius):
+        outer = current_radius + self.GLOW_OFFSET + self.GLOW_WIDTH
+        sprite = pygame.Surface((outer * 2, outer * 2), pygame.SRCALPHA)
+        center = (outer, outer)
+
+        # Gradient rings, darkest towards the middle
+        step = self.ring_step
+        for i in range(0, current_radius, step):
+            ring_color = tuple(max(0, min(255, c - i)) for c in color)
+            pygame.draw.circle(sprite, ring_color, center, current_radius - i, step + 1)
+
+        # Outer glow
+        glow_color = tuple(min(255, c + 50) for c in color)
+        pygame.draw.circle(sprite, glow_color, center, current_radius + self.GLOW_OFFSET, self.GLOW_WIDTH)
+        sprite = display_format(sprite, alpha=True)
+        # Run-length encoding skips the transparent corners and the flat
+        # rings, several times faster to blit with identical output
+        sprite.set_alpha(255, pygame.RLEACCEL)
+        return sprite
+
+    def set_ring_step(self, step):
+        """Change ring density; sprites re-render a few per frame as they are drawn"""
+        self.ring_step = step
+
+    def clear(self):
+        self.sprites.clear()
+        self.latest.clear()
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (text, font, color)"""
+
+    def __init__(self, render, max_entries=256):
+        # render(text, font, color) -> Surface, called only on a miss
+        self.render = render
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, font, color):
+        key = (text, font, color)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.render(text, font, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+
+
+class GlyphAtlas:
+    """Glyphs of one font and color rendered once into a single surface.
+
+    Text is drawn glyph by glyph as subsurface blits, so animated text can
+    move each character on its own without rendering anything per frame.
+    Characters not seen before are added by rebuilding the atlas.
+    """
+
+    def __init__(self, font, color, chars=""):
+        self.font = font
+        self.color = color
+        self.surface = None
+        self.glyphs = {}
+        self.advances = {}
+        self.add(chars)
+
+    def add(self, chars):
+        new = [char for char in dict.fromkeys(chars) if char not in self.glyphs]
+        if not new:
+            return
+        rendered = {char: self.font.render(char, True, self.color)
+                    for char in list(self.glyphs) + new}
+
+        width = sum(glyph.get_width() for glyph in rendered.values())
+        height = max(glyph.get_height() for glyph in rendered.values())
+        self.surface = pygame.Surface((max(1, width), height), pygame.SRCALPHA)
+        x = 0
+        for char, glyph in rendered.items():
+            self.surface.blit(glyph, (x, 0))
+            self.glyphs[char] = self.surface.subsurface((x, 0, glyph.get_width(), glyph.get_height()))
+            x += glyph.get_width()
+
+        for char in new:
+            metrics = self.font.metrics(char)
+            advance = metrics[0][4] if metrics and metrics[0] else None
+            self.advances[char] = advance if advance is not None else rendered[char].get_width()
+
+    def size(self, text):
+        self.add(text)
+        width = sum(self.advances[char] for char in text)
+        return width, self.font.get_height()
+
+    def draw(self, screen, text, pos, spacing=None, offsets=None):
+        """Blit text with its top-left at pos; returns the rect covered.
+
+        spacing fixes the distance between glyph origins instead of using
+        each glyph's advance, and offsets(i) gives an (dx, dy) per glyph.
+        """
+        self.add(text)
+        x, y = pos
+        covered = None
+        for i, char in enumerate(text):
+            glyph_x, glyph_y = x, y
+            if offsets is not None:
+                dx, dy = offsets(i)
+                glyph_x += dx
+                glyph_y += dy
+            rect = screen.blit(self.glyphs[char], (glyph_x, glyph_y))
+            covered = rect if covered is None else covered.union(rect)
+            x += spacing if spacing is not None else self.advances[char]
+        return covered
+
+
+# Shared by every MathBall; sprites only depend on color and size
+ball_sprites = BallSpriteCache()
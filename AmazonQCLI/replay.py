@@ -0,0 +1,234 @@
+"""Record a session's inputs and play them back.
+
+A GameSimulation is deterministic given its seed, settings and the tick at
+which each input arrives, so a recording is just those: a header with the
+seed, ball cap and problem tiers, then every key press and click stamped
+with the sim tick it was applied at, then an end record with the tick the
+session stopped and its results. Replaying feeds the inputs back at the
+same ticks and must arrive at the same score, problems_solved and
+correct_answers. Inputs reach the file as they happen, so a session that
+crashed or was killed before writing its end record still replays up to
+its last input.
+
+Record with `python math_ball_game.py --record session.mbr`, watch it with
+`--replay session.mbr`, or check it headless as fast as possible:
+
+    python replay.py session.mbr
+"""
+import argparse
+import struct
+import sys
+import time
+
+from simulation import TICK_RATE, GameSimulation
+
+MAGIC = b"MBRP"
+VERSION = 1
+HEADER = struct.Struct("<4sHqHB")
+MOUSE = struct.Struct("<hh")
+RESULTS = struct.Struct("<iII")
+
+# Record kinds
+KIND_KEY = 0
+KIND_MOUSE = 1
+KIND_END = 2
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def results(sim):
+    return (sim.score, sim.problems_solved, sim.correct_answers)
+
+
+class Recorder:
+    """Stands in for a GameSimulation's input methods and logs each call.
+
+    Inputs are forwarded to the sim unchanged. Each is buffered as a few
+    bytes until the next flush(), which the game calls once per frame.
+    """
+
+    def __init__(self, sim, path):
+        self.sim = sim
+        self.path = path
+        self.file = open(path, "wb")
+        # Tiers keep their order: it decides how the deck maps its RNG draws
+        tiers = sim.deck.tiers
+        self.data = bytearray(HEADER.pack(MAGIC, VERSION, sim.seed, sim.max_balls, len(tiers)))
+        self.data += bytes(tiers)
+        self.flush()
+        self.last_tick = 0
+        self.closed = False
+
+    def stamp(self, kind):
+        write_varint(self.data, self.sim.ticks - self.last_tick)
+        self.last_tick = self.sim.ticks
+        self.data.append(kind)
+
+    def key_down(self, key, char=""):
+        encoded = char.encode("utf-8")[:255]
+        self.stamp(KIND_KEY)
+        self.data += bytes((key, len(encoded))) + encoded
+        self.sim.key_down(key, char)
+
+    def mouse_down(self, pos):
+        # The sim sees the position exactly as it is logged
+        pos = (int(pos[0]), int(pos[1]))
+        self.stamp(KIND_MOUSE)
+        self.data += MOUSE.pack(*pos)
+        self.sim.mouse_down(pos)
+
+    def flush(self):
+        """Write the buffered inputs out to the file"""
+        if self.data:
+            self.file.write(self.data)
+            self.file.flush()
+            self.data.clear()
+
+    def close(self):
+        if self.closed:
+            return
+        self.stamp(KIND_END)
+        self.data += RESULTS.pack(*results(self.sim))
+        self.flush()
+        self.file.close()
+        self.closed = True
+
+
+class Replay:
+    """A loaded recording: settings, inputs by tick, and expected results.
+
+    A recording without an end record ends at its last input, and its
+    expected results are None.
+    """
+
+    def __init__(self, seed, max_balls, tiers, inputs, end_tick, expected):
+        self.seed = seed
+        self.max_balls = max_balls
+        self.tiers = tiers
+        # (tick, kind, args) in the order they were applied
+        self.inputs = inputs
+        self.end_tick = end_tick
+        self.expected = expected
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is not a recording")
+        magic, version, seed, max_balls, tier_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} recording")
+        offset = HEADER.size + tier_count
+        tiers = list(data[HEADER.size:offset])
+
+        inputs = []
+        tick = 0
+        try:
+            while True:
+                delta, offset = read_varint(data, offset)
+                tick += delta
+                kind = data[offset]
+                offset += 1
+                if kind == KIND_KEY:
+                    key, length = data[offset], data[offset + 1]
+                    char = data[offset + 2:offset + 2 + length].decode("utf-8")
+                    offset += 2 + length
+                    inputs.append((tick, KIND_KEY, (key, char)))
+                elif kind == KIND_MOUSE:
+                    inputs.append((tick, KIND_MOUSE, (MOUSE.unpack_from(data, offset),)))
+                    offset += MOUSE.size
+                elif kind == KIND_END:
+                    expected = RESULTS.unpack_from(data, offset)
+                    return cls(seed, max_balls, tiers, inputs, tick, expected)
+                else:
+                    raise ValueError(f"{path}: unknown record kind {kind} at byte {offset - 1}")
+        except (IndexError, struct.error):
+            # The session never closed; keep every input written in full
+            end_tick = inputs[-1][0] if inputs else 0
+            return cls(seed, max_balls, tiers, inputs, end_tick, None)
+
+    def simulation(self):
+        return GameSimulation(self.seed, tiers=self.tiers, max_balls=self.max_balls)
+
+
+class ReplayFeeder:
+    """Applies a replay's inputs to a sim as it reaches each input's tick"""
+
+    def __init__(self, replay, sim):
+        self.replay = replay
+        self.sim = sim
+        self.next = 0
+
+    @property
+    def finished(self):
+        return self.next >= len(self.replay.inputs) and self.sim.ticks >= self.replay.end_tick
+
+    def feed(self):
+        """Apply every input due at the sim's current tick"""
+        inputs = self.replay.inputs
+        while self.next < len(inputs) and inputs[self.next][0] <= self.sim.ticks:
+            tick, kind, args = inputs[self.next]
+            if kind == KIND_KEY:
+                self.sim.key_down(*args)
+            else:
+                self.sim.mouse_down(*args)
+            self.next += 1
+
+
+def replay_headless(replay):
+    """Run a replay to its end tick without rendering; returns the sim"""
+    sim = replay.simulation()
+    feeder = ReplayFeeder(replay, sim)
+    while True:
+        feeder.feed()
+        if feeder.finished:
+            return sim
+        sim.tick()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a Math Ball Catcher recording headless")
+    parser.add_argument("path", help="recording made with math_ball_game.py --record")
+    args = parser.parse_args(argv)
+
+    replay = Replay.load(args.path)
+    start = time.perf_counter()
+    sim = replay_headless(replay)
+    elapsed = time.perf_counter() - start
+
+    game_seconds = replay.end_tick / TICK_RATE
+    print(f"{len(replay.inputs)} inputs over {game_seconds:.1f} s of game time, replayed in "
+          f"{elapsed * 1000:.0f} ms ({game_seconds / max(elapsed, 1e-9):.0f}x real time)")
+    print(f"score {sim.score}, problems solved {sim.problems_solved}, "
+          f"correct answers {sim.correct_answers}")
+    if replay.expected is None:
+        print("the session did not close cleanly, so there are no results to check; "
+              "replayed up to its last input")
+        return 0
+    if results(sim) != replay.expected:
+        print(f"MISMATCH: recorded score {replay.expected[0]}, problems solved "
+              f"{replay.expected[1]}, correct answers {replay.expected[2]}")
+        return 1
+    print("matches the recorded session")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import asyncio
+import sys
+import time
+from array import array
+
+from profiler import DEFAULT_CAPACITY, summarize
+
+# asyncio.sleep can wake a millisecond or more late, so the last stretch
+# before a frame is spent yielding with sleep(0) instead. The browser paces
+# the web build's event loop itself, so there it just sleeps.
+SPIN_SECONDS = 0 if sys.platform == "emscripten" else 0.002
+
+
+class FrameScheduler:
+    """Paces frames by awaiting the rest of each frame's budget.
+
+    wait() replaces the blocking pygame Clock.tick: it sleeps on the event
+    loop, so other tasks (asset loading and the like) run between frames.
+    Frames are due at fixed intervals from a running deadline rather than
+    from whenever the last one ended, so a late wake-up doesn't delay every
+    frame after it. A frame more than a whole interval late restarts the
+    schedule instead of rushing to catch up.
+
+    How late each wake-up was (jitter, milliseconds) is kept in a ring
+    buffer the same size as the profiler's.
+    """
+
+    def __init__(self, fps, clock=time.perf_counter, spin=SPIN_SECONDS, capacity=DEFAULT_CAPACITY):
+        # Frames per second to pace at; 0 only yields to other tasks
+        self.fps = fps
+        self.clock = clock
+        self.spin = spin
+        self.deadline = None
+        self.capacity = capacity
+        self.jitter = array('d', bytes(8 * capacity))
+        self.frames = 0
+
+    async def wait(self):
+        """Return once the next frame is due"""
+        now = self.clock()
+        if self.fps <= 0:
+            await asyncio.sleep(0)
+            return
+
+        period = 1 / self.fps
+        if self.deadline is None or now - self.deadline > period:
+            self.deadline = now
+
+        remaining = self.deadline - now - self.spin
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        else:
+            # Other tasks get a turn every frame, however busy
+            await asyncio.sleep(0)
+        while self.clock() < self.deadline:
+            await asyncio.sleep(0)
+
+        self.jitter[self.frames % self.capacity] = (self.clock() - self.deadline) * 1000
+        self.frames += 1
+        self.deadline += period
+
+    def history(self):
+        """Jitter samples in milliseconds, oldest first"""
+        if self.frames <= self.capacity:
+            return list(self.jitter[:self.frames])
+        start = self.frames % self.capacity
+        return list(self.jitter[start:]) + list(self.jitter[:start])
+
+    def summary(self):
+        return summarize(self.history())
@@ -0,0 +1,494 @@
+"""Host many headless game sessions for thin clients on the local network.
+
+Each client connection gets its own GameSimulation. Sessions are sharded
+across worker processes, and each worker ticks all of its sessions from
+one asyncio loop. On Linux the workers share one port with SO_REUSEPORT
+and the kernel spreads connections between them. Elsewhere worker i
+listens on port + i and clients spread themselves.
+
+Messages are a little-endian u16 length followed by a kind byte. Clients
+send key presses and clicks, laid out as in a replay recording. Every
+SEND_EVERY ticks the server answers with a diff of what changed since the
+last one it sent: scalar fields flagged in a bitmask, balls spawned and
+balls removed. Balls fall at a constant speed, so moving them costs no
+bytes; clients advance them themselves.
+
+    python server.py serve --workers 4
+    python server.py load --workers 2 --sessions 400
+
+`load` starts a local server and connects simulated students to it in
+steps, reporting tick latency and how many sessions each core sustains.
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import random
+import socket
+import struct
+import sys
+import time
+from collections import deque
+
+from leaderboard import Leaderboard
+from problem_bank import default_bank
+from profiler import DEFAULT_CAPACITY, summarize
+from replay import KIND_KEY, KIND_MOUSE, MOUSE
+from scheduler import FrameScheduler
+from simulation import (
+    BALL_COLORS, EVENT_ROUND_OVER, KEY_OTHER, KEY_RETURN, KEY_SPACE, TICK_RATE, GameSimulation
+)
+
+DEFAULT_PORT = 8765
+# Ticks between diffs; clients animate the ticks in between themselves
+SEND_EVERY = 2
+# A client this far behind on reading is skipped until it catches up; its
+# next diff then covers everything it missed
+MAX_BUFFERED = 64 * 1024
+# Load test: a step passes while p99 tick latency stays within one tick
+LATENCY_BUDGET_MS = 1000 / TICK_RATE
+# Only Linux balances connections between sockets sharing a port
+REUSE_PORT = sys.platform.startswith("linux") and hasattr(socket, "SO_REUSEPORT")
+
+# Message kinds; inputs share the replay format's numbering and layout
+MSG_KEY = KIND_KEY
+MSG_MOUSE = KIND_MOUSE
+MSG_DIFF = 16
+MSG_STATS = 17
+
+FRAME = struct.Struct("<H")
+# kind, sim tick, when the tick was due (perf_counter seconds), field mask
+DIFF_HEADER = struct.Struct("<BIdB")
+COUNT = struct.Struct("<H")
+# serial, x, y, speed, radius, color index, problem index in the bank
+SPAWN = struct.Struct("<IhffBBH")
+SERIAL = struct.Struct("<I")
+# kind, worker, sessions, tick work p50 and p99, wake-up jitter p99 (ms)
+STATS = struct.Struct("<BBHfff")
+
+STATES = ("menu", "name_input", "game", "game_over")
+# Diff fields in mask bit order; None marks u8-length-prefixed UTF-8 text
+FIELDS = ("state", "score", "results", "time_left", "selected", "input_text", "player_name")
+FIELD_FORMATS = (
+    struct.Struct("<B"), struct.Struct("<i"), struct.Struct("<HH"), struct.Struct("<B"),
+    struct.Struct("<i"), None, None
+)
+
+logger = logging.getLogger("mathball.server")
+
+
+def snapshot(sim):
+    """A session's diff field values, in FIELDS order"""
+    selected = sim.selected_ball
+    return (STATES.index(sim.state), sim.score, (sim.problems_solved, sim.correct_answers),
+            max(0, math.ceil(sim.time_left)), -1 if selected is None else selected.serial,
+            sim.input_text, sim.player_name)
+
+
+def pack_field(out, index, value):
+    fmt = FIELD_FORMATS[index]
+    if fmt is None:
+        encoded = value.encode("utf-8")[:255]
+        out.append(len(encoded))
+        out += encoded
+    elif isinstance(value, tuple):
+        out += fmt.pack(*value)
+    else:
+        out += fmt.pack(value)
+
+
+def unpack_field(data, offset, index):
+    fmt = FIELD_FORMATS[index]
+    if fmt is None:
+        length = data[offset]
+        return data[offset + 1:offset + 1 + length].decode("utf-8"), offset + 1 + length
+    values = fmt.unpack_from(data, offset)
+    return (values if len(values) > 1 else values[0]), offset + fmt.size
+
+
+class Session:
+    """One client's game, plus what that client has been sent of it"""
+
+    def __init__(self, writer, seed=None):
+        self.sim = GameSimulation(seed)
+        self.writer = writer
+        self.sent = (None,) * len(FIELDS)
+        self.sent_balls = set()
+
+    def receive(self, message):
+        kind = message[0]
+        if kind == MSG_KEY:
+            length = message[2]
+            self.sim.key_down(message[1], message[3:3 + length].decode("utf-8", "replace"))
+        elif kind == MSG_MOUSE:
+            self.sim.mouse_down(MOUSE.unpack_from(message, 1))
+        else:
+            raise ValueError(f"unknown message kind {kind}")
+
+    def diff(self, due):
+        """Encoded changes since the last diff, or None if nothing changed"""
+        sim = self.sim
+        values = snapshot(sim)
+        mask = 0
+        body = bytearray()
+        for index, (value, sent) in enumerate(zip(values, self.sent)):
+            if value != sent:
+                mask |= 1 << index
+                pack_field(body, index, value)
+
+        live = {ball.serial: ball for ball in sim.balls}
+        spawned = [ball for serial, ball in live.items() if serial not in self.sent_balls]
+        removed = self.sent_balls.difference(live)
+        if not (mask or spawned or removed):
+            return None
+
+        out = bytearray(DIFF_HEADER.pack(MSG_DIFF, sim.ticks, due, mask))
+        out += body
+        out += COUNT.pack(len(spawned))
+        for ball in spawned:
+            out += SPAWN.pack(ball.serial, ball.x, ball.y, ball.speed, ball.radius,
+                              BALL_COLORS.index(ball.color), ball.problem)
+        out += COUNT.pack(len(removed))
+        for serial in removed:
+            out += SERIAL.pack(serial)
+        self.sent = values
+        self.sent_balls = set(live)
+        return out
+
+
+class Worker:
+    """One process's share of the sessions, all ticked from one loop"""
+
+    def __init__(self, index, host, port, reuse_port=REUSE_PORT, leaderboard=None):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        # Database path to save finished rounds to, if any
+        self.leaderboard_path = leaderboard
+        self.leaderboard = None
+        self.sessions = set()
+        self.scheduler = FrameScheduler(TICK_RATE)
+        # Milliseconds spent ticking and sending per tick
+        self.work = deque(maxlen=DEFAULT_CAPACITY)
+
+    async def serve(self):
+        options = {"reuse_port": True} if self.reuse_port else {}
+        server = await asyncio.start_server(self.connect, self.host, self.port, **options)
+        logger.info("worker %d listening on %s:%d", self.index, self.host, self.port)
+        if self.leaderboard_path:
+            self.leaderboard = Leaderboard(self.leaderboard_path)
+        try:
+            async with server:
+                await self.tick_loop()
+        finally:
+            if self.leaderboard:
+                self.leaderboard.close()
+
+    async def connect(self, reader, writer):
+        session = Session(writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+                message = await reader.readexactly(size)
+                if message[:1] == bytes((MSG_STATS,)):
+                    self.send(writer, self.stats())
+                else:
+                    session.receive(message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (ValueError, IndexError, struct.error) as e:
+            logger.info("worker %d dropping a client: %s", self.index, e)
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    async def tick_loop(self):
+        period = 1 / TICK_RATE
+        for ticks in itertools.count(1):
+            await self.scheduler.wait()
+            start = time.perf_counter()
+            due = self.scheduler.deadline - period
+            send = ticks % SEND_EVERY == 0
+            for session in self.sessions:
+                sim = session.sim
+                sim.tick()
+                for event in sim.pop_events():
+                    if event[0] == EVENT_ROUND_OVER and self.leaderboard:
+                        self.leaderboard.record(sim.player_name, sim.score, sim.problems_solved,
+                                                sim.correct_answers)
+                if send and session.writer.transport.get_write_buffer_size() < MAX_BUFFERED:
+                    data = session.diff(due)
+                    if data is not None:
+                        self.send(session.writer, data)
+            self.work.append((time.perf_counter() - start) * 1000)
+
+    def send(self, writer, data):
+        writer.write(FRAME.pack(len(data)) + data)
+
+    def stats(self):
+        work = summarize(self.work) or {"p50": 0, "p99": 0}
+        jitter = self.scheduler.summary() or {"p99": 0}
+        return STATS.pack(MSG_STATS, self.index, len(self.sessions),
+                          work["p50"], work["p99"], jitter["p99"])
+
+
+def run_worker(index, host, port, reuse_port, leaderboard=None, verbose=False):
+    """Process entry point for one worker"""
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARNING)
+    try:
+        asyncio.run(Worker(index, host, port, reuse_port, leaderboard).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def worker_ports(port, workers, reuse_port=REUSE_PORT):
+    return [port] * workers if reuse_port else [port + index for index in range(workers)]
+
+
+def start_workers(host, port, workers, leaderboard=None, verbose=False):
+    """Start the worker processes; returns them and the ports they listen on"""
+    ports = worker_ports(port, workers)
+    processes = [multiprocessing.Process(target=run_worker, daemon=True,
+                                         args=(index, host, worker_port, REUSE_PORT, leaderboard, verbose))
+                 for index, worker_port in enumerate(ports)]
+    for process in processes:
+        process.start()
+    return processes, ports
+
+
+class RemoteBall:
+    __slots__ = ("serial", "x", "y", "speed", "radius", "color", "problem")
+
+
+class RemoteSession:
+    """A client's copy of a served session, kept current by applying diffs.
+
+    Between diffs, balls fall by their speed every tick of a round, just
+    as they do on the server.
+    """
+
+    def __init__(self):
+        self.values = [None] * len(FIELDS)
+        self.balls = {}
+        self.tick = 0
+
+    @property
+    def state(self):
+        return None if self.values[0] is None else STATES[self.values[0]]
+
+    def __getattr__(self, name):
+        # score, results, time_left, selected, input_text, player_name
+        if name in FIELDS:
+            return self.values[FIELDS.index(name)]
+        raise AttributeError(name)
+
+    def apply(self, message):
+        """Apply one diff; returns when its tick was due on the server"""
+        _, tick, due, mask = DIFF_HEADER.unpack_from(message)
+        if self.state == "game":
+            fallen = tick - self.tick
+            for ball in self.balls.values():
+                ball.y += ball.speed * fallen
+        self.tick = tick
+
+        offset = DIFF_HEADER.size
+        for index in range(len(FIELDS)):
+            if mask & (1 << index):
+                self.values[index], offset = unpack_field(message, offset, index)
+
+        count, = COUNT.unpack_from(message, offset)
+        offset += COUNT.size
+        for _ in range(count):
+            ball = RemoteBall()
+            (ball.serial, ball.x, ball.y, ball.speed, ball.radius, color,
+             ball.problem) = SPAWN.unpack_from(message, offset)
+            ball.color = BALL_COLORS[color]
+            self.balls[ball.serial] = ball
+            offset += SPAWN.size
+        count, = COUNT.unpack_from(message, offset)
+        offset += COUNT.size
+        for _ in range(count):
+            self.balls.pop(SERIAL.unpack_from(message, offset)[0], None)
+            offset += SERIAL.size
+        return due
+
+
+class SessionClient:
+    """Connection to a served session, with the sim's input methods"""
+
+    def __init__(self):
+        self.remote = RemoteSession()
+        # Milliseconds from a tick being due to its diff being applied here
+        self.latency = deque(maxlen=DEFAULT_CAPACITY)
+        self.stats = None
+        self.reader = self.writer = None
+
+    async def connect(self, host, port, timeout=5.0):
+        """Connect, retrying while the server is still starting"""
+        give_up = time.perf_counter() + timeout
+        while True:
+            try:
+                self.reader, self.writer = await asyncio.open_connection(host, port)
+                return
+            except OSError:
+                if time.perf_counter() > give_up:
+                    raise
+                await asyncio.sleep(0.1)
+
+    def send(self, message):
+        self.writer.write(FRAME.pack(len(message)) + message)
+
+    def key_down(self, key, char=""):
+        encoded = char.encode("utf-8")[:255]
+        self.send(bytes((MSG_KEY, key, len(encoded))) + encoded)
+
+    def mouse_down(self, pos):
+        self.send(bytes((MSG_MOUSE,)) + MOUSE.pack(int(pos[0]), int(pos[1])))
+
+    def request_stats(self):
+        self.stats = None
+        self.send(bytes((MSG_STATS,)))
+
+    async def receive(self):
+        """Apply messages from the server until it disconnects"""
+        try:
+            while True:
+                size, = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+                message = await self.reader.readexactly(size)
+                if message[0] == MSG_DIFF:
+                    due = self.remote.apply(message)
+                    self.latency.append((time.perf_counter() - due) * 1000)
+                elif message[0] == MSG_STATS:
+                    self.stats = STATS.unpack(message)[1:]
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def play(client, rng, bank):
+    """Drive a client like an unhurried student: about one input a second"""
+    while True:
+        await asyncio.sleep(rng.uniform(0.3, 1.2))
+        remote = client.remote
+        if remote.state in ("menu", "game_over"):
+            client.key_down(KEY_SPACE, " ")
+        elif remote.state == "name_input":
+            if remote.player_name:
+                client.key_down(KEY_RETURN)
+            else:
+                client.key_down(KEY_OTHER, "s")
+        elif remote.state == "game":
+            ball = remote.balls.get(remote.selected)
+            if ball is not None:
+                for char in str(bank.answers[ball.problem]):
+                    client.key_down(KEY_OTHER, char)
+                client.key_down(KEY_RETURN)
+            elif remote.balls:
+                ball = max(remote.balls.values(), key=lambda ball: ball.y)
+                client.mouse_down((ball.x, ball.y))
+
+
+async def worker_stats(clients, workers):
+    """Latest stats of each worker, collected through its own clients"""
+    for client in clients:
+        client.request_stats()
+    stats = {}
+    give_up = time.perf_counter() + 1.0
+    while len(stats) < workers and time.perf_counter() < give_up:
+        await asyncio.sleep(0.05)
+        for client in clients:
+            if client.stats is not None:
+                stats[client.stats[0]] = client.stats[1:]
+    return stats
+
+
+async def load_test(host, ports, sessions, step, hold):
+    """Add `step` clients at a time until latency runs over budget"""
+    bank = default_bank()
+    rng = random.Random(0)
+    workers = len(ports)
+    clients = []
+    tasks = []
+    sustained = 0
+    print(f"{'sessions':>8} {'latency p50':>12} {'p99':>8} {'work p99':>9} {'jitter p99':>11}   (ms)")
+    try:
+        while len(clients) < sessions:
+            for _ in range(min(step, sessions - len(clients))):
+                client = SessionClient()
+                await client.connect(host, ports[len(clients) % workers])
+                clients.append(client)
+                tasks.append(asyncio.ensure_future(client.receive()))
+                tasks.append(asyncio.ensure_future(play(client, rng, bank)))
+            # Let the new sessions settle before measuring
+            await asyncio.sleep(hold / 2)
+            for client in clients:
+                client.latency.clear()
+            await asyncio.sleep(hold)
+
+            latency = summarize(itertools.chain.from_iterable(client.latency for client in clients))
+            stats = (await worker_stats(clients, workers)).values()
+            work = max((s[2] for s in stats), default=0)
+            jitter = max((s[3] for s in stats), default=0)
+            if latency is None:
+                print(f"{len(clients):>8}  no diffs received")
+                break
+            print(f"{len(clients):>8} {latency['p50']:>12.2f} {latency['p99']:>8.2f} "
+                  f"{work:>9.2f} {jitter:>11.2f}")
+            if latency["p99"] > LATENCY_BUDGET_MS:
+                break
+            sustained = len(clients)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for client in clients:
+            client.close()
+
+    print(f"sustained {sustained} sessions on {workers} worker processes "
+          f"({sustained / workers:.0f} per core) within a p99 tick latency of "
+          f"{LATENCY_BUDGET_MS:.1f} ms")
+    return sustained
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve headless Math Ball Catcher sessions")
+    parser.add_argument("command", choices=("serve", "load"),
+                        help="serve clients, or load-test a local server")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="port to listen on; without SO_REUSEPORT, worker i uses port + i")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--sessions", type=int, default=400, help="load: most sessions to try")
+    parser.add_argument("--step", type=int, default=50, help="load: sessions added per step")
+    parser.add_argument("--hold", type=float, default=4.0, help="load: seconds measured per step")
+    parser.add_argument("--leaderboard", metavar="PATH", help="save finished rounds to this database")
+    parser.add_argument("--verbose", action="store_true", help="log connections and worker details")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    processes, ports = start_workers(args.host, args.port, args.workers, args.leaderboard, args.verbose)
+    try:
+        if args.command == "load":
+            asyncio.run(load_test(args.host, ports, args.sessions, args.step, args.hold))
+        else:
+            print(f"serving on {args.host} port{'s' if len(set(ports)) > 1 else ''} "
+                  f"{', '.join(map(str, sorted(set(ports))))} with {args.workers} workers")
+            for process in processes:
+                process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""Headless game rules for Math Ball Catcher.
+
+GameSimulation owns everything that decides how a session plays out: the
+screen flow, falling balls, problems, answers and score. It never imports
+pygame, reads time only through an injectable clock and draws randomness
+from its own seeded RNG, so it can be stepped tick by tick faster than
+real time. The renderer feeds it input and reacts to the events it emits.
+"""
+import random
+
+from problem_bank import ProblemDeck, default_bank
+from spatial_hash import SpatialHash
+
+SCREEN_WIDTH = 1300
+SCREEN_HEIGHT = 800
+
+# Same palette as the renderer's named colors
+BALL_COLORS = [
+    (0, 100, 255), (0, 255, 0), (255, 0, 0), (255, 255, 0),
+    (128, 0, 128), (255, 165, 0), (255, 192, 203), (0, 255, 255)
+]
+
+TICK_RATE = 60
+TICK_SECONDS = 1 / TICK_RATE
+ROUND_SECONDS = 30
+MAX_BALLS = 8
+# Ball cap for storm mode. New balls may not overlap, so about this many
+# is all the screen holds; a higher cap would never be reached.
+STORM_BALLS = 100
+MIN_RADIUS = 50
+MAX_RADIUS = 80
+# How far the renderer's pulse and glow reach beyond a ball's radius
+BALL_REACH = 13
+# Upward nudges a new ball gets to clear the balls above the screen
+SPAWN_ATTEMPTS = 8
+# Chance per tick of a new ball at the default cap, while under half the
+# cap and once past it
+SPAWN_CHANCE = 0.025
+CROWDED_SPAWN_CHANCE = 0.015
+FEEDBACK_TICKS = 150
+MAX_NAME_LENGTH = 25
+MAX_ANSWER_LENGTH = 10
+CORRECT_POINTS = 5
+WRONG_PENALTY = 2
+# Game-over ratings, best first, with the score and accuracy (%) each
+# needs; a session that earns none of them is rated a learner
+RATINGS = (("genius", 150, 80), ("expert", 100, 70), ("scholar", 60, 60), ("student", 30, 0))
+RATING_NAMES = tuple(name for name, _, _ in RATINGS) + ("learner",)
+
+# Logical keys; the renderer maps its own key codes onto these
+KEY_OTHER = 0
+KEY_SPACE = 1
+KEY_RETURN = 2
+KEY_BACKSPACE = 3
+KEY_ESCAPE = 4
+
+# Events queued in GameSimulation.events for the renderer
+EVENT_ROUND_STARTED = "round_started"    # ()
+EVENT_BALL_SELECTED = "ball_selected"    # (ball,)
+EVENT_ANSWERED = "answered"              # (correct, x, y)
+EVENT_ROUND_OVER = "round_over"          # ()
+EVENT_RESTARTED = "restarted"            # ()
+EVENT_QUIT = "quit"                      # ()
+
+
+def rate(score, accuracy):
+    """Index into RATING_NAMES of the best rating a result earns"""
+    for index, (_, min_score, min_accuracy) in enumerate(RATINGS):
+        if score >= min_score and accuracy >= min_accuracy:
+            return index
+    return len(RATINGS)
+
+
+class MathBall:
+    __slots__ = ("rng", "deck", "x", "y", "prev_y", "radius", "speed", "color", "pulse",
+                 "label", "label_font", "problem", "answer", "question", "index", "serial")
+
+    def __init__(self, x, y, rng=random, deck=None):
+        self.rng = rng
+        # Problems come from the session's deck so they don't repeat
+        self.deck = deck or ProblemDeck(default_bank(), rng)
+        # Position in the BallPool's live list
+        self.index = -1
+        self.reset(x, y)
+
+    def reset(self, x, y):
+        """Start over as a new ball at (x, y); used when recycled"""
+        self.x = x
+        self.y = y
+        # Position at the previous tick, for interpolated drawing
+        self.prev_y = y
+        rng = self.rng
+        self.radius = rng.randint(MIN_RADIUS, MAX_RADIUS)
+        self.speed = rng.uniform(1.5, 3.5)
+        self.color = rng.choice(BALL_COLORS)
+        self.pulse = 0
+        # Renderer-owned cache of the rendered question
+        self.label = None
+        self.label_font = None
+        self.generate_problem()
+
+    def generate_problem(self):
+        """Take the next medium-hard problem from the deck"""
+        self.problem = self.deck.draw()
+        self.answer = self.deck.bank.answers[self.problem]
+        self.question = self.deck.bank.question(self.problem)
+
+    def update(self):
+        self.prev_y = self.y
+        self.y += self.speed
+        self.pulse += 0.1
+
+    def is_clicked(self, pos):
+        dx = pos[0] - self.x
+        dy = pos[1] - self.y
+        return dx * dx + dy * dy <= self.radius * self.radius
+
+    def is_out_of_bounds(self):
+        return self.y > SCREEN_HEIGHT + 100
+
+
+class BallPool:
+    """Live balls plus a free list of removed ones to recycle.
+
+    Iterates like a list of the live balls. Removal swaps the last live
+    ball into the removed one's slot, so it is O(1) but does not keep
+    spawn order; each ball's serial records that instead, and later balls
+    are drawn on top. Live balls are also filed in a spatial hash, which
+    whoever moves them keeps current.
+    """
+
+    def __init__(self, rng, deck):
+        self.rng = rng
+        self.deck = deck
+        self.live = []
+        self.free = []
+        self.spawned = 0
+        # A cell spans the reach of the largest ball
+        self.grid = SpatialHash(cell_size=MAX_RADIUS + BALL_REACH)
+
+    def __len__(self):
+        return len(self.live)
+
+    def __iter__(self):
+        return iter(self.live)
+
+    def __getitem__(self, index):
+        return self.live[index]
+
+    def spawn(self, x, y):
+        if self.free:
+            ball = self.free.pop()
+            ball.reset(x, y)
+        else:
+            ball = MathBall(x, y, self.rng, self.deck)
+        ball.index = len(self.live)
+        ball.serial = self.spawned
+        self.spawned += 1
+        self.live.append(ball)
+        self.grid.insert(ball, ball.x, ball.y)
+        return ball
+
+    def remove(self, ball):
+        self.grid.remove(ball)
+        last = self.live.pop()
+        if last is not ball:
+            self.live[ball.index] = last
+            last.index = ball.index
+        ball.index = -1
+        self.free.append(ball)
+
+    def clear(self):
+        for ball in self.live:
+            ball.index = -1
+        self.free.extend(self.live)
+        self.live.clear()
+        self.grid.clear()
+
+    def in_spawn_order(self):
+        """Live balls bottom to top, the order to draw them in"""
+        return sorted(self.live, key=lambda ball: ball.serial)
+
+    def topmost_at(self, pos):
+        """The most recently spawned ball under pos, or None"""
+        hit = None
+        for ball in self.grid.near(pos[0], pos[1], MAX_RADIUS):
+            if ball.is_clicked(pos) and (hit is None or ball.serial > hit.serial):
+                hit = ball
+        return hit
+
+    def clear_spot(self, x, y):
+        """y, or the nearest y above it, where a new ball overlaps none.
+
+        Overlap allows for the largest possible new ball, so the check can
+        run before the ball's size is drawn. Returns None if nudging the
+        spot up SPAWN_ATTEMPTS times doesn't clear it.
+        """
+        reach = MAX_RADIUS + BALL_REACH
+        for _ in range(SPAWN_ATTEMPTS):
+            blocker = None
+            for ball in self.grid.near(x, y, reach + MAX_RADIUS + BALL_REACH):
+                gap = reach + ball.radius + BALL_REACH
+                if (ball.x - x) ** 2 + (ball.y - y) ** 2 < gap * gap:
+                    blocker = ball
+                    break
+            if blocker is None:
+                return y
+            y = blocker.y - (reach + blocker.radius + BALL_REACH)
+        return None
+
+
+class GameSimulation:
+    """One player's session, advanced explicitly with tick()"""
+
+    def __init__(self, seed=None, clock=None, tiers=None, max_balls=MAX_BALLS):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # Difficulty tiers to draw problems from; None for all of them
+        self.deck = ProblemDeck(default_bank(), self.rng, tiers)
+        self.max_balls = max_balls
+        self.balls = BallPool(self.rng, self.deck)
+        self.ticks = 0
+        # Seconds as a float; defaults to game time derived from the tick count
+        self.clock = clock or self.tick_time
+        self.events = []
+
+        self.state = "menu"
+        self.player_name = ""
+        self.start_time = 0
+        self.reset_round()
+
+    def tick_time(self):
+        return self.ticks * TICK_SECONDS
+
+    def reset_round(self):
+        self.score = 0
+        self.time_left = ROUND_SECONDS
+        self.balls.clear()
+        self.input_text = ""
+        self.selected_ball = None
+        self.last_answer_correct = None
+        self.answer_feedback_timer = 0
+        self.problems_solved = 0
+        self.correct_answers = 0
+
+    @property
+    def accuracy(self):
+        return int((self.correct_answers / max(1, self.problems_solved)) * 100)
+
+    @property
+    def rating(self):
+        return rate(self.score, self.accuracy)
+
+    def pop_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def start_round(self):
+        self.reset_round()
+        self.state = "game"
+        self.start_time = self.clock()
+        self.events.append((EVENT_ROUND_STARTED,))
+
+    def key_down(self, key, char=""):
+        """Apply one key press; char is the text it produced, if any"""
+        if self.state == "menu":
+            if key == KEY_SPACE:
+                self.state = "name_input"
+
+        elif self.state == "name_input":
+            if key == KEY_RETURN and self.player_name.strip():
+                self.start_round()
+            elif key == KEY_BACKSPACE:
+                self.player_name = self.player_name[:-1]
+            elif key != KEY_RETURN:
+                if len(self.player_name) < MAX_NAME_LENGTH and char.isprintable():
+                    self.player_name += char
+
+        elif self.state == "game":
+            if self.selected_ball:
+                if key == KEY_RETURN:
+                    self.check_answer()
+                elif key == KEY_BACKSPACE:
+                    self.input_text = self.input_text[:-1]
+                elif char and (char.isdigit() or char in '.-'):
+                    if len(self.input_text) < MAX_ANSWER_LENGTH:
+                        # Allow negative numbers and decimals
+                        if char == '-' and self.input_text:
+                            pass  # Don't allow minus in middle
+                        elif char == '.' and '.' in self.input_text:
+                            pass  # Don't allow multiple decimals
+                        else:
+                            self.input_text += char
+
+        elif self.state == "game_over":
+            if key == KEY_SPACE:
+                self.state = "name_input"
+                self.player_name = ""
+                self.events.append((EVENT_RESTARTED,))
+            elif key == KEY_ESCAPE:
+                self.events.append((EVENT_QUIT,))
+
+    def mouse_down(self, pos):
+        if self.state == "game" and not self.selected_ball:
+            self.handle_ball_click(pos)
+
+    def tick(self):
+        """Advance the session by one fixed step"""
+        self.ticks += 1
+        if self.state == "game":
+            self.update_game()
+
+    def spawn_ball(self):
+        if len(self.balls) < self.max_balls:
+            x = self.rng.randint(80, SCREEN_WIDTH - 80)
+            y = self.balls.clear_spot(x, self.rng.randint(-120, -60))
+            if y is not None:
+                self.balls.spawn(x, y)
+
+    def update_game(self):
+        self.time_left = ROUND_SECONDS - (self.clock() - self.start_time)
+
+        if self.time_left <= 0:
+            self.state = "game_over"
+            self.events.append((EVENT_ROUND_OVER,))
+            return
+
+        # Update balls and check if selected ball is out of bounds. Going
+        # backwards, a swap-removal only moves in a ball already updated.
+        balls = self.balls.live
+        grid = self.balls.grid
+        for i in range(len(balls) - 1, -1, -1):
+            ball = balls[i]
+            ball.update()
+            grid.move(ball, ball.x, ball.y)
+            if ball.is_out_of_bounds():
+                # If the selected ball goes out of bounds, close the popup
+                if self.selected_ball is ball:
+                    self.selected_ball = None
+                    self.input_text = ""
+                self.balls.remove(ball)
+
+        # Spawn balls randomly (like raindrops), faster the higher the cap
+        spawn_probability = SPAWN_CHANCE if len(self.balls) < self.max_balls // 2 else CROWDED_SPAWN_CHANCE
+        spawn_probability *= self.max_balls / MAX_BALLS
+        if self.rng.random() < spawn_probability:
+            self.spawn_ball()
+
+        if self.answer_feedback_timer > 0:
+            self.answer_feedback_timer -= 1
+
+    def handle_ball_click(self, pos):
+        ball = self.balls.topmost_at(pos)
+        if ball is not None:
+            self.selected_ball = ball
+            self.input_text = ""
+            self.events.append((EVENT_BALL_SELECTED, ball))
+
+    def check_answer(self):
+        try:
+            # Handle both integer and decimal answers
+            if '.' in str(self.selected_ball.answer):
+                user_answer = float(self.input_text)
+                correct = abs(user_answer - self.selected_ball.answer) < 0.01
+            else:
+                user_answer = int(self.input_text)
+                correct = user_answer == self.selected_ball.answer
+        except ValueError:
+            return
+
+        self.problems_solved += 1
+
+        if correct:
+            self.score += CORRECT_POINTS
+            self.correct_answers += 1
+            self.last_answer_correct = True
+        else:
+            self.score -= WRONG_PENALTY
+            self.last_answer_correct = False
+        self.events.append((EVENT_ANSWERED, correct, self.selected_ball.x, self.selected_ball.y))
+
+        # Set feedback timer
+        self.answer_feedback_timer = FEEDBACK_TICKS
+
+        self.balls.remove(self.selected_ball)
+        self.selected_ball = None
+        self.input_text = ""
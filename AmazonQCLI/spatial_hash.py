@@ -0,0 +1,58 @@
+class SpatialHash:
+    """Uniform grid of points for nearby lookups in about constant time.
+
+    Each item is filed under the cell holding its position. Queries scan
+    only the cells within `reach` of a point, so their cost depends on how
+    crowded those cells are rather than on the total number of items.
+    Moving an item only touches the grid when it crosses into a new cell.
+    """
+
+    def __init__(self, cell_size=96):
+        self.cell_size = cell_size
+        self.cells = {}
+        # item -> key of the cell it is filed under
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def key(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def insert(self, item, x, y):
+        key = self.key(x, y)
+        self.keys[item] = key
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = cell = set()
+        cell.add(item)
+
+    def remove(self, item):
+        key = self.keys.pop(item)
+        cell = self.cells[key]
+        cell.discard(item)
+        if not cell:
+            del self.cells[key]
+
+    def move(self, item, x, y):
+        # Called for every item every tick; usually the cell is unchanged
+        size = self.cell_size
+        if (int(x // size), int(y // size)) != self.keys[item]:
+            self.remove(item)
+            self.insert(item, x, y)
+
+    def near(self, x, y, reach):
+        """Items in every cell within `reach` of (x, y), in no particular order"""
+        size = self.cell_size
+        left, right = int((x - reach) // size), int((x + reach) // size)
+        top, bottom = int((y - reach) // size), int((y + reach) // size)
+        cells = self.cells
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    yield from cell
+
+    def clear(self):
+        self.cells.clear()
+        self.keys.clear()